@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Benchmark the C/C++ domain check.
+
+Compare inferring the domain from the predefined macros only against walking all
+the top-level cursors of a translation unit that includes system headers.
+"""
+
+import argparse
+import os
+import tempfile
+import timeit
+
+from clang.cindex import Index, TranslationUnit
+
+from hawkmoth.doccursor import CursorKind
+from hawkmoth.parser import _get_inferred_domain
+from hawkmoth.util import compiler
+
+_SOURCES = {
+    'c': ('source.c', '#include <stdio.h>\n#include <stdlib.h>\n#include <string.h>\n'),
+    'cpp': ('source.cpp', '#include <string>\n#include <vector>\n#include <map>\n'),
+}
+
+
+def _walk_all_cursors(tu):
+    """The previous implementation: walk all the top-level cursors."""
+    for cursor in tu.cursor.get_children():
+        if cursor.kind == CursorKind.MACRO_DEFINITION and cursor.spelling.startswith('__cpp_'):
+            return 'cpp'
+
+    return 'c'
+
+
+def _bench(domain, directory, number):
+    filename, contents = _SOURCES[domain]
+    filename = os.path.join(directory, filename)
+    with open(filename, 'w') as f:
+        f.write(contents)
+
+    lang = 'c++' if domain == 'cpp' else 'c'
+    args = [f'-x{lang}'] + compiler.get_include_args('clang', lang)
+    options = (
+        TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
+        | TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+    )
+
+    tu = Index.create().parse(filename, args=args, options=options)
+
+    assert _get_inferred_domain(tu) == domain
+    num_cursors = sum(1 for _ in tu.cursor.get_children())
+
+    # In C, the old walk never finds a C++ macro, and visits every cursor.
+    old = min(timeit.repeat(lambda: _walk_all_cursors(tu), number=number, repeat=3)) / number
+    new = min(timeit.repeat(lambda: _get_inferred_domain(tu), number=number, repeat=3)) / number
+
+    print(f'{domain}: {num_cursors} top-level cursors')
+    print(f'  all cursors:        {old * 1000:8.3f} ms')
+    print(f'  predefined macros:  {new * 1000:8.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=10, help='iterations per repeat')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for domain in _SOURCES:
+            _bench(domain, directory, args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Benchmark the javadoc transform.
+
+Extract the documentation comments from the given files, by default the
+javadoc example and a synthetic header with javadoc-style comments, and
+transform them using the previous and the current implementation. Check that
+the results are identical. Pass the headers of a project using Doxygen-style
+comments for a realistic corpus.
+"""
+
+import argparse
+import contextlib
+import os
+import re
+import tempfile
+import timeit
+
+from synthetic import Counts, generate
+
+from hawkmoth.docstring import DocstringProcessor
+from hawkmoth.ext import javadoc
+from hawkmoth.parser import parse
+
+_EXAMPLE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'examples', 'javadoc.c'
+)
+
+
+def _previous_inline_markup(line):
+    """The previous implementation: all the substitutions on every line."""
+    OP = javadoc.OP
+    word_regex = r'[^\s.]+'
+    tagged_phrase_regex = r'[^<]*'
+
+    line = re.sub(rf'{OP}(a|e|em)\s+(?P<markup>{word_regex})', r'*\g<markup>*', line)
+    line = re.sub(rf'<em>(?P<markup>{tagged_phrase_regex})</em>', r'*\g<markup>*', line)
+    line = re.sub(rf'{OP}b\s+(?P<markup>{word_regex})', r'**\g<markup>**', line)
+    line = re.sub(rf'<b>(?P<markup>{tagged_phrase_regex})</b>', r'**\g<markup>**', line)
+    line = re.sub(rf'{OP}(c|p)\s+(?P<markup>{word_regex})', r'``\g<markup>``', line)
+    line = re.sub(rf'<tt>(?P<markup>{tagged_phrase_regex})</tt>', r'``\g<markup>``', line)
+    line = re.sub(rf'{OP}ref\s+(?P<ref>\w+)', r':any:`\g<ref>`', line)
+
+    return line
+
+
+def _previous_convert(lines):
+    """The previous implementation: match the command pattern on every line."""
+    handler = javadoc._plain()
+
+    for line in lines:
+        if line.strip() == '' and handler.blank_line_ends():
+            handler = javadoc._plain()
+            yield from handler.convert(line)
+            continue
+
+        mo = javadoc._command_pattern.match(line)
+        if mo is None:
+            yield from handler.convert(line)
+            continue
+
+        command = mo.group('command')
+
+        handler_cls = javadoc._handlers.get(command)
+        if handler_cls is None or not handler.command_ends(command):
+            yield from handler.convert(line)
+            continue
+
+        handler = handler_cls(**mo.groupdict())
+
+        yield from handler.header()
+
+
+@contextlib.contextmanager
+def _previous_implementation():
+    inline_markup = vars(javadoc._handler)['_inline_markup']
+    javadoc._handler._inline_markup = staticmethod(_previous_inline_markup)
+    try:
+        yield
+    finally:
+        javadoc._handler._inline_markup = inline_markup
+
+
+class _Collector(DocstringProcessor):
+    """Collect the comments as passed to the transforms."""
+
+    def __init__(self):
+        self.comments = []
+
+    def process_docstring(self, lines):
+        self.comments.append(list(lines))
+
+
+def _collect(filenames):
+    collector = _Collector()
+
+    for filename in filenames:
+        domain = 'cpp' if os.path.splitext(filename)[1] in ['.cpp', '.hpp', '.cc', '.hh'] else 'c'
+        root, _ = parse(filename, domain=domain)
+        for comment in root.walk():
+            comment.get_docstring(processor=collector)
+
+    return collector.comments
+
+
+def _transform(comments, convert):
+    return [list(convert(lines)) for lines in comments]
+
+
+def _bench(comments, number):
+    num_lines = sum(len(lines) for lines in comments)
+
+    with _previous_implementation():
+        expected = _transform(comments, _previous_convert)
+        old = min(
+            timeit.repeat(lambda: _transform(comments, _previous_convert), number=number, repeat=3)
+        )
+
+    if _transform(comments, javadoc._convert) != expected:
+        raise RuntimeError('the results of the implementations differ')
+
+    new = min(
+        timeit.repeat(lambda: _transform(comments, javadoc._convert), number=number, repeat=3)
+    )
+
+    print(f'{len(comments)} comments, {num_lines} lines')
+    for name, t in [('previous', old), ('current', new)]:
+        t /= number
+        print(f'  {name:10} {t * 1000:8.2f} ms {num_lines / t / 1000:8.0f} klines/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', metavar='FILE', nargs='*', help='files to extract comments from')
+    parser.add_argument('--functions', type=int, default=500, help='synthetic functions')
+    parser.add_argument('--number', type=int, default=10, help='iterations per repeat')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = args.files
+        if not filenames:
+            filename = os.path.join(directory, 'synthetic.h')
+            counts = Counts(functions=args.functions, structs=0, enums=0, macros=0)
+            with open(filename, 'w') as f:
+                f.writelines(generate('c', counts, style='javadoc'))
+
+            filenames = [_EXAMPLE, filename]
+
+        comments = _collect(filenames)
+
+    _bench(comments, args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Benchmark the memory footprint of parse results.
+
+Measure the memory retained by the materialized docstring trees parsed from
+generated C and C++ sources, both as parsed and as unpickled, e.g. from the
+on-disk cache or the parse worker processes.
+"""
+
+import argparse
+import gc
+import os
+import pickle
+import tempfile
+import tracemalloc
+
+from bench_parse import _GENERATORS
+
+from hawkmoth.parser import parse
+
+
+def _count(root):
+    return sum(1 + _count(ds) for ds in root)
+
+
+def _measure(fn):
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+
+    result = fn()
+
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+
+    return result, after - before
+
+
+def _bench(domain, directory, count, copies):
+    filename, generate = _GENERATORS[domain]
+    filename = os.path.join(directory, filename)
+
+    with open(filename, 'w') as f:
+        f.writelines(generate(count))
+
+    def parse_roots():
+        roots = []
+        for _ in range(copies):
+            root, _ = parse(filename, domain=domain)
+            root.materialize()
+            roots.append(root)
+
+        return roots
+
+    roots, parsed_size = _measure(parse_roots)
+    num_docstrings = sum(_count(root) for root in roots)
+
+    data = [pickle.dumps(root, protocol=pickle.HIGHEST_PROTOCOL) for root in roots]
+    del roots
+
+    _, unpickled_size = _measure(lambda: [pickle.loads(d) for d in data])
+
+    print(f'{domain}: {num_docstrings} docstrings')
+    for name, size in [('parsed', parsed_size), ('unpickled', unpickled_size)]:
+        print(f'  {name + ":":10} {size / 1024:8.0f} KiB, {size / num_docstrings:6.0f} B/docstring')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=500, help='number of generated blocks')
+    parser.add_argument('--copies', type=int, default=4, help='number of parse results to keep')
+    args = parser.parse_args()
+
+    tracemalloc.start()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for domain in _GENERATORS:
+            _bench(domain, directory, args.count, args.copies)
+
+
+if __name__ == '__main__':
+    main()
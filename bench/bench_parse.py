@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Benchmark parsing and rendering a generated source file.
+
+The generated file has documented variables, arrays, function pointers,
+structures, functions, and for C++, classes with methods, all nested in
+namespaces.
+"""
+
+import argparse
+import os
+import tempfile
+import timeit
+
+from hawkmoth.docstring import DocstringProcessor
+from hawkmoth.parser import parse
+
+
+def _generate_c(count):
+    for i in range(count):
+        yield f"""
+/** Variable {i}. */
+static const int var_{i}[4][2];
+
+/** Function pointer {i}. */
+int (*fp_{i})(int a, char *b);
+
+/** Structure {i}. */
+struct struct_{i} {{
+\t/** Member. */
+\tint a[8];
+\t/** Function pointer member. */
+\tvoid (*fn)(struct struct_{i} *s, const char *fmt, ...);
+}};
+
+/** Function {i}. */
+static inline int function_{i}(int a, const char *b[], void (*cb)(int));
+"""
+
+
+def _generate_cpp(count):
+    yield 'namespace outer {\nnamespace inner {\n'
+
+    for i in range(count):
+        yield f"""
+/** Variable {i}. */
+constexpr int var_{i} = {i};
+
+/** Class {i}. */
+class class_{i} {{
+public:
+\t/** Member. */
+\tmutable int member[4];
+\t/** Method. */
+\tvirtual int method(int a, const char *b) const noexcept;
+\t/** Static method. */
+\tstatic void static_method(void (*cb)(int));
+}};
+
+/** Function {i}. */
+template <typename T, int N>
+T function_{i}(T (&array)[N]);
+"""
+
+    yield '}\n}\n'
+
+
+_GENERATORS = {
+    'c': ('source.c', _generate_c),
+    'cpp': ('source.cpp', _generate_cpp),
+}
+
+
+def _parse_and_render(filename, domain):
+    root, _ = parse(filename, domain=domain)
+
+    processor = DocstringProcessor()
+    for ds in root.walk():
+        ds.get_docstring(processor=processor)
+
+
+def _bench(domain, directory, count, number):
+    filename, generate = _GENERATORS[domain]
+    filename = os.path.join(directory, filename)
+
+    with open(filename, 'w') as f:
+        f.writelines(generate(count))
+
+    t = min(timeit.repeat(lambda: _parse_and_render(filename, domain), number=number, repeat=3))
+
+    print(f'{domain}: {count} blocks: {t / number * 1000:.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=500, help='number of generated blocks')
+    parser.add_argument('--number', type=int, default=3, help='iterations per repeat')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for domain in _GENERATORS:
+            _bench(domain, directory, args.count, args.number)
+
+
+if __name__ == '__main__':
+    main()
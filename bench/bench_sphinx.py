@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Benchmark Sphinx builds of a synthetic project using Hawkmoth.
+
+Generate a project with a number of documents and synthetic C and C++ headers.
+The documents use c:autodoc and c:autofunction directives with the javadoc
+transform for the C headers, and cpp:autoclass directives with the napoleon
+transform for the C++ headers.
+
+Run cold builds from scratch, warm builds without changes, and incremental
+builds after changing one header, both serially and in parallel. Each build
+runs in a fresh process. Report the wall time, the CPU time, the peak RSS, and
+the share of the CPU time spent in Hawkmoth, in docutils parsing the
+reStructuredText produced by Hawkmoth ("nested rst"), and elsewhere, including
+docutils parsing the documents themselves and Sphinx writing the output. The
+shares are based on the hawkmoth_timings_report.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from synthetic import Counts, generate
+
+from hawkmoth.util.timing import get_peak_rss
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_CONF = """
+extensions = ['hawkmoth', 'hawkmoth.ext.javadoc', 'hawkmoth.ext.napoleon']
+hawkmoth_root = {root!r}
+hawkmoth_timings_report = 'hawkmoth-timings.json'
+# The directives in different documents overlap.
+suppress_warnings = ['duplicate_declaration.c', 'duplicate_declaration.cpp']
+"""
+
+# Directive phases that are Hawkmoth, as opposed to the nested parse
+_HAWKMOTH_PHASES = ['parse', 'filter', 'render', 'transform']
+
+# Symbols per directive, different for each document of a header
+_SYMBOLS_PER_DOCUMENT = 3
+
+
+def _header_name(k):
+    return f'header_{k}.h' if k % 2 == 0 else f'header_{k}.hpp'
+
+
+def _document(i, headers, counts):
+    k = i % headers
+    r = i // headers
+    header = _header_name(k)
+
+    lines = [f'Document {i}', '=' * len(f'Document {i}'), '']
+
+    def symbols(count):
+        return [(r * _SYMBOLS_PER_DOCUMENT + j) % count for j in range(_SYMBOLS_PER_DOCUMENT)]
+
+    if k % 2 == 1:
+        # Spread over namespaces as in synthetic.generate()
+        declarations = counts.functions + counts.structs + counts.enums + counts.templates
+        size = -(-declarations // counts.namespaces)
+        first = counts.functions + counts.structs + counts.enums
+
+        for t in symbols(counts.templates):
+            namespace = (first + t) // size
+            lines += [
+                f'.. cpp:autoclass:: namespace_{namespace}::template_{t}',
+                f'   :file: {header}',
+                '   :members:',
+                '   :transform: napoleon',
+                '',
+            ]
+    elif r == 0:
+        lines += [f'.. c:autodoc:: {header}', '   :transform: javadoc', '']
+    else:
+        for f in symbols(counts.functions):
+            lines += [
+                f'.. c:autofunction:: function_{f}',
+                f'   :file: {header}',
+                '   :transform: javadoc',
+                '',
+            ]
+
+    return '\n'.join(lines)
+
+
+def _generate_project(directory, documents, headers, counts):
+    srcdir = os.path.join(directory, 'src')
+    os.makedirs(srcdir)
+
+    for k in range(headers):
+        domain, style = ('c', 'javadoc') if k % 2 == 0 else ('cpp', 'napoleon')
+        with open(os.path.join(srcdir, _header_name(k)), 'w') as f:
+            f.writelines(generate(domain, counts, style=style))
+
+    with open(os.path.join(srcdir, 'conf.py'), 'w') as f:
+        f.write(_CONF.format(root=srcdir))
+
+    with open(os.path.join(srcdir, 'index.rst'), 'w') as f:
+        f.write('Index\n=====\n\n.. toctree::\n   :glob:\n\n   document_*\n')
+
+    for i in range(documents):
+        with open(os.path.join(srcdir, f'document_{i}.rst'), 'w') as f:
+            f.write(_document(i, headers, counts))
+
+    return srcdir
+
+
+def _cpu_time():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _build(srcdir, outdir, jobs):
+    from sphinx.cmd.build import build_main
+
+    cpu = _cpu_time()
+    start = time.perf_counter()
+
+    status = build_main(['-b', 'html', '-q', '-j', str(jobs), srcdir, outdir])
+
+    wall = time.perf_counter() - start
+    cpu = _cpu_time() - cpu
+
+    # Include the parallel build worker processes.
+    peak_rss = get_peak_rss()
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+        peak_rss = max(peak_rss, children)
+
+    return status, wall, cpu, peak_rss
+
+
+def _hawkmoth_cpu(outdir):
+    with open(os.path.join(outdir, 'hawkmoth-timings.json')) as f:
+        report = json.load(f)
+
+    hawkmoth, nested = 0.0, 0.0
+    for document in report['documents']:
+        for directive in document['directives']:
+            for name, phase in directive['phases'].items():
+                if name in _HAWKMOTH_PHASES:
+                    hawkmoth += phase['cpu']
+                elif name == 'nested_parse':
+                    nested += phase['cpu']
+
+    return hawkmoth, nested
+
+
+def _run(srcdir, outdir, jobs):
+    # A fresh process for each build
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        status, wall, cpu, peak_rss = executor.submit(_build, srcdir, outdir, jobs).result()
+
+    if status != 0:
+        raise RuntimeError(f'sphinx-build failed with status {status}')
+
+    hawkmoth, nested = _hawkmoth_cpu(outdir)
+
+    return wall, cpu, peak_rss, hawkmoth, nested
+
+
+def _print_header():
+    print(
+        f'{"build":12} {"jobs":>4} {"wall (s)":>9} {"cpu (s)":>9} {"peak RSS":>10} '
+        f'{"hawkmoth":>11} {"nested rst":>11} {"other":>11}'
+    )
+
+
+def _print_result(build, jobs, wall, cpu, peak_rss, hawkmoth, nested):
+    def share(t):
+        return f'{t / cpu * 100:10.0f}%' if cpu else f'{"-":>11}'
+
+    print(
+        f'{build:12} {jobs:4} {wall:9.2f} {cpu:9.2f} {peak_rss / (1024 * 1024):6.0f} MiB '
+        f'{share(hawkmoth)} {share(nested)} {share(cpu - hawkmoth - nested)}',
+        flush=True,
+    )
+
+
+def _bench(directory, args, counts, jobs):
+    srcdir = _generate_project(
+        os.path.join(directory, f'j{jobs}'), args.documents, args.headers, counts
+    )
+    outdir = os.path.join(directory, f'j{jobs}', 'html')
+
+    _print_result('cold', jobs, *_run(srcdir, outdir, jobs))
+    _print_result('warm', jobs, *_run(srcdir, outdir, jobs))
+
+    # Change one header, rebuilding the documents that depend on it.
+    with open(os.path.join(srcdir, _header_name(0)), 'a') as f:
+        f.write('\n/** Added. */\nint added;\n')
+
+    _print_result('incremental', jobs, *_run(srcdir, outdir, jobs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--documents', type=int, default=60, help='number of documents')
+    parser.add_argument('--headers', type=int, default=12, help='number of headers')
+    parser.add_argument(
+        '--jobs', type=int, default=4, help='number of processes for the parallel builds'
+    )
+    parser.add_argument('--functions', type=int, default=50, help='functions per header')
+    parser.add_argument('--templates', type=int, default=10, help='templates per header')
+    parser.add_argument('--keep', metavar='DIR', help='generate the project in DIR and keep it')
+    args = parser.parse_args()
+
+    counts = Counts(
+        functions=args.functions,
+        structs=5,
+        members=10,
+        enums=5,
+        enumerators=10,
+        macros=20,
+        templates=args.templates,
+        namespaces=2,
+    )
+
+    _print_header()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.keep:
+            directory = args.keep
+
+        for jobs in [1, args.jobs]:
+            _bench(directory, args, counts, jobs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Benchmark parser throughput and memory usage on growing synthetic headers.
+
+Generate synthetic C and C++ headers at increasing scales, and measure the time
+to parse them and to evaluate all the docstring fields, the throughput in
+tokens and docstrings per second, and the peak memory usage. Each measurement
+runs in a fresh process, for the peak memory usage to be meaningful.
+
+Optionally save the results as a baseline, or compare the results against a
+saved baseline, failing if any of them have regressed more than the threshold.
+The baseline depends on the machine, so compare against baselines saved on the
+same machine only.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from synthetic import Counts, generate
+
+from hawkmoth.parser import parse
+from hawkmoth.util.timing import Timings, get_peak_rss
+
+_FILENAMES = {
+    'c': 'synthetic.h',
+    'cpp': 'synthetic.hpp',
+}
+
+# Metrics compared against the baseline, lower is better
+_METRICS = ['time', 'peak_rss']
+
+
+def _parse(filename, domain):
+    timings = Timings()
+
+    root, _ = parse(filename, domain=domain, timings=timings)
+
+    # Evaluate the lazy docstring fields.
+    root.materialize()
+
+    return sum(1 for _ in root.walk()), timings.counters['tokens']
+
+
+def _measure(filename, domain, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        docstrings, tokens = _parse(filename, domain)
+        elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {
+        'bytes': os.path.getsize(filename),
+        'docstrings': docstrings,
+        'tokens': tokens,
+        'time': best,
+        'tokens_per_s': tokens / best,
+        'docstrings_per_s': docstrings / best,
+        'peak_rss': get_peak_rss(),
+    }
+
+
+def _run(domain, scale, counts, directory, repeat):
+    filename = os.path.join(directory, f'{scale}-{_FILENAMES[domain]}')
+    with open(filename, 'w') as f:
+        f.writelines(generate(domain, counts.scaled(scale)))
+
+    # A fresh process for each measurement
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        result = executor.submit(_measure, filename, domain, repeat).result()
+
+    return {'domain': domain, 'scale': scale, **result}
+
+
+def _print_result(result, baseline):
+    peak_rss = result['peak_rss'] / (1024 * 1024) if result['peak_rss'] else 0
+
+    line = (
+        f'{result["domain"]:3} x{result["scale"]:<3} '
+        f'{result["bytes"] / 1024:8.0f} KiB {result["docstrings"]:7} docstrings '
+        f'{result["time"] * 1000:9.1f} ms {result["tokens_per_s"] / 1000:8.0f} ktokens/s '
+        f'{result["docstrings_per_s"]:8.0f} docstrings/s {peak_rss:7.1f} MiB'
+    )
+
+    if baseline is not None:
+        changes = ' '.join(
+            f'{metric} {(result[metric] / baseline[metric] - 1) * 100:+.0f}%'
+            for metric in _METRICS
+            if result[metric] and baseline.get(metric)
+        )
+        line += f'  ({changes})'
+
+    print(line, flush=True)
+
+
+def _regressions(results, baseline, threshold):
+    for result in results:
+        base = baseline.get((result['domain'], result['scale']))
+        if base is None:
+            continue
+
+        for metric in _METRICS:
+            if (
+                result[metric]
+                and base.get(metric)
+                and result[metric] > base[metric] * (1 + threshold)
+            ):
+                yield f'{result["domain"]} x{result["scale"]}: {metric} regressed'
+
+
+def _read_baseline(filename):
+    with open(filename) as f:
+        return {(r['domain'], r['scale']): r for r in json.load(f)['results']}
+
+
+def _scales(argument):
+    return [int(scale) for scale in argument.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--scales', type=_scales, default=[1, 2, 4, 8], help='comma separated input scales'
+    )
+    parser.add_argument('--domain', choices=list(_FILENAMES), action='append', help='domains')
+    parser.add_argument('--repeat', type=int, default=3, help='repeats per measurement')
+    parser.add_argument('--baseline', help='baseline file to compare against')
+    parser.add_argument('--save-baseline', metavar='FILE', help='save the results as a baseline')
+    parser.add_argument(
+        '--threshold', type=float, default=0.25, help='relative regression threshold'
+    )
+    counts = Counts()
+    for field in vars(counts):
+        parser.add_argument(
+            f'--{field}', type=int, default=getattr(counts, field), help=f'number of {field}'
+        )
+    args = parser.parse_args()
+
+    counts = Counts(**{field: getattr(args, field) for field in vars(counts)})
+    baseline = _read_baseline(args.baseline) if args.baseline else {}
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for domain in args.domain or list(_FILENAMES):
+            for scale in args.scales:
+                result = _run(domain, scale, counts, directory, args.repeat)
+                _print_result(result, baseline.get((domain, scale)))
+                results.append(result)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'counts': vars(counts), 'results': results}, f, indent=2)
+            f.write('\n')
+
+    regressions = list(_regressions(results, baseline, args.threshold))
+    for regression in regressions:
+        print(f'REGRESSION: {regression}', file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Benchmark transforming comments in parallel.
+
+Extract the documentation comments from synthetic headers with napoleon-style
+comments of growing size, and transform them using the napoleon transform
+serially, and in parallel in chunks in a process pool, as with the
+hawkmoth_transform_jobs option. Find the crossover point, i.e. the smallest
+number of comments for which the parallel transform is faster. The process pool
+is started before the measurements, as it's reused across directives in Sphinx
+builds.
+"""
+
+import argparse
+import os
+import tempfile
+import timeit
+import types
+
+from sphinx.ext import napoleon
+from synthetic import Counts, generate
+
+import hawkmoth
+from hawkmoth.docstring import DocstringProcessor
+from hawkmoth.ext.napoleon import _get_settings, _process_docstrings_chunk
+from hawkmoth.parser import parse
+
+
+class _Collector(DocstringProcessor):
+    """Collect the comments as passed to the transforms."""
+
+    def __init__(self):
+        self.comments = []
+
+    def process_docstring(self, lines):
+        self.comments.append(list(lines))
+
+
+def _collect(directory, functions):
+    filename = os.path.join(directory, f'{functions}.h')
+    counts = Counts(functions=functions, structs=0, enums=0, macros=0)
+    with open(filename, 'w') as f:
+        f.writelines(generate('c', counts, style='napoleon'))
+
+    collector = _Collector()
+
+    root, _ = parse(filename, domain='c')
+    for comment in root.walk():
+        comment.get_docstring(processor=collector)
+
+    return collector.comments
+
+
+def _serial(comments, settings):
+    batch = [list(lines) for lines in comments]
+
+    _process_docstrings_chunk(batch, settings, {})
+
+    return batch
+
+
+def _parallel(comments, settings, app):
+    batch = [list(lines) for lines in comments]
+
+    hawkmoth.transform_in_parallel(app, _process_docstrings_chunk, batch, settings, {})
+
+    return batch
+
+
+def _bench(comments, settings, app, number):
+    if _parallel(comments, settings, app) != _serial(comments, settings):
+        raise RuntimeError('the results of the serial and parallel transforms differ')
+
+    serial = min(timeit.repeat(lambda: _serial(comments, settings), number=number, repeat=3))
+    parallel = min(
+        timeit.repeat(lambda: _parallel(comments, settings, app), number=number, repeat=3)
+    )
+
+    return serial / number, parallel / number
+
+
+def _sizes(argument):
+    return [int(size) for size in argument.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--sizes',
+        type=_sizes,
+        default=[10, 25, 50, 100, 200, 500, 1000, 2000, 5000, 10000],
+        help='comma separated numbers of comments',
+    )
+    parser.add_argument(
+        '--jobs', type=int, default=os.cpu_count() or 1, help='number of worker processes'
+    )
+    parser.add_argument('--number', type=int, default=3, help='iterations per repeat')
+    args = parser.parse_args()
+
+    # Always transform in parallel, in as many chunks as there are workers.
+    hawkmoth._TRANSFORM_CHUNK_SIZE = 1
+
+    app = types.SimpleNamespace(config=types.SimpleNamespace(hawkmoth_transform_jobs=args.jobs))
+    settings = _get_settings(napoleon.Config())
+
+    # Start the process pool.
+    hawkmoth._get_executor(args.jobs).submit(int).result()
+
+    print(f'{"comments":>8} {"serial (ms)":>12} {"parallel (ms)":>14} {"speedup":>8}')
+
+    crossover = None
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for size in args.sizes:
+                comments = _collect(directory, size)
+
+                serial, parallel = _bench(comments, settings, app, args.number)
+                if crossover is None and parallel < serial:
+                    crossover = size
+
+                print(
+                    f'{len(comments):8} {serial * 1000:12.2f} {parallel * 1000:14.2f} '
+                    f'{serial / parallel:7.2f}x',
+                    flush=True,
+                )
+    finally:
+        hawkmoth._shutdown_executors()
+
+    if crossover is None:
+        print(f'jobs {args.jobs}: parallel is slower at all sizes')
+    else:
+        print(f'jobs {args.jobs}: parallel is faster from {crossover} comments')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Synthetic C and C++ header generator for benchmarks.
+
+The generated headers have documented functions, structures with members,
+enumerations with enumerators, and macros, and for C++, class and function
+templates, all spread over namespaces. The number of each is configurable, as
+is the style of the function documentation comments.
+"""
+
+import dataclasses
+
+
+@dataclasses.dataclass
+class Counts:
+    """The number of each kind of generated symbols."""
+
+    functions: int = 200
+    structs: int = 20
+    members: int = 20
+    enums: int = 10
+    enumerators: int = 50
+    macros: int = 100
+    # C++ only
+    templates: int = 20
+    namespaces: int = 4
+
+    def scaled(self, scale):
+        """Return the counts scaled by scale, apart from the sizes of compounds."""
+        return dataclasses.replace(
+            self,
+            functions=self.functions * scale,
+            structs=self.structs * scale,
+            enums=self.enums * scale,
+            macros=self.macros * scale,
+            templates=self.templates * scale,
+        )
+
+
+def _macro(i):
+    return f"""
+/** Macro {i}. */
+#define MACRO_{i}(a, b) ((a) + (b) * {i})
+"""
+
+
+# Function documentation comment bodies by style, i.e. transform
+_FUNCTION_COMMENTS = {
+    'rst': """
+ * :param a: The first parameter.
+ * :param b: The second parameter.
+ * :param cb: Callback.
+ * :return: The result.""",
+    'javadoc': """
+ * @param a The first parameter.
+ * @param b The second parameter.
+ * @param cb Callback.
+ * @return The result.""",
+    'napoleon': """
+ * Args:
+ *     a: The first parameter.
+ *     b: The second parameter.
+ *     cb: Callback.
+ *
+ * Returns:
+ *     The result.""",
+}
+
+
+def _function(i, style):
+    return f"""
+/**
+ * Function {i}.
+ *{_FUNCTION_COMMENTS[style]}
+ */
+int function_{i}(int a, const char *b[], void (*cb)(int));
+"""
+
+
+def _struct(i, members):
+    body = ''.join(f'\t/** Member {j}. */\n\tint member_{j}[{j + 1}];\n' for j in range(members))
+
+    return f"""
+/** Structure {i}. */
+struct struct_{i} {{
+{body}}};
+"""
+
+
+def _enum(i, enumerators):
+    body = ''.join(f'\t/** Enumerator {j}. */\n\tENUM_{i}_{j} = {j},\n' for j in range(enumerators))
+
+    return f"""
+/** Enumeration {i}. */
+enum enum_{i} {{
+{body}}};
+"""
+
+
+def _template(i):
+    return f"""
+/** Class template {i}. */
+template <typename T, int N>
+class template_{i} {{
+public:
+\t/** Method. */
+\tT method(const T *array, int index = N) const noexcept;
+\t/** Static method. */
+\tstatic void static_method(void (*cb)(T));
+}};
+
+/** Function template {i}. */
+template <typename T>
+T function_template_{i}(const template_{i}<T, 4> &t);
+"""
+
+
+def _declarations(domain, counts, style):
+    for i in range(counts.functions):
+        yield _function(i, style)
+
+    for i in range(counts.structs):
+        yield _struct(i, counts.members)
+
+    for i in range(counts.enums):
+        yield _enum(i, counts.enumerators)
+
+    if domain == 'cpp':
+        for i in range(counts.templates):
+            yield _template(i)
+
+
+def generate(domain, counts, style='rst'):
+    """Yield the contents of a synthetic header, in pieces.
+
+    The style of the function documentation comments is one of 'rst',
+    'javadoc', or 'napoleon'.
+    """
+    # Macros don't belong in namespaces.
+    for i in range(counts.macros):
+        yield _macro(i)
+
+    declarations = list(_declarations(domain, counts, style))
+
+    if domain != 'cpp' or counts.namespaces == 0:
+        yield from declarations
+        return
+
+    # Spread the declarations evenly over the namespaces, keeping the names
+    # unique.
+    size = -(-len(declarations) // counts.namespaces)
+    for n in range(counts.namespaces):
+        yield f'\nnamespace namespace_{n} {{\n'
+        yield from declarations[n * size : (n + 1) * size]
+        yield f'\n}} // namespace namespace_{n}\n'
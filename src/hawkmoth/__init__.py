@@ -8,7 +8,11 @@ Hawkmoth
 Sphinx C Domain autodoc directive extension.
 """
 
+import concurrent.futures
+import functools
 import glob
+import itertools
+import json
 import os
 from typing import Optional
 
@@ -21,12 +25,134 @@ from sphinx.util.docutils import SphinxDirective, switch_source_input
 from sphinx.util.nodes import nested_parse_with_titles
 
 from hawkmoth import docstring
-from hawkmoth.parser import ErrorLevel, parse
+from hawkmoth.cache import (
+    MemoryCache,
+    ParseCache,
+    PchCache,
+    TransformCache,
+    is_pure_transform,
+)
+from hawkmoth.parser import ErrorLevel, ParserError, ParseSession, parse
+from hawkmoth.symboldb import SymbolDatabase
 from hawkmoth.util import compiler, strutil
+from hawkmoth.util.fileutil import file_stamp
+from hawkmoth.util.timing import NullTimings, Timings
 
 with open(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'VERSION')) as version_file:
     __version__ = version_file.read().strip()
 
+# Parse results shared across all the documents in the build
+_memory_cache = MemoryCache()
+
+# Transformed documentation comments shared across all the documents in the build
+_transform_cache = TransformCache()
+
+# Translation units kept around for reparsing, also across incremental builds
+_parse_session = ParseSession()
+
+# Precompiled header clang args per header, domain and clang args, for the build
+_pch_args: dict[tuple[str, str, tuple[str, ...]], list[str]] = {}
+
+# Symbol database file name, stamp, and the database, opened on demand
+_symbol_database: Optional[tuple[str, tuple[int, int], SymbolDatabase]] = None
+
+# Process pools for parsing and transforming, by the number of workers in them
+_executors: dict[int, concurrent.futures.ProcessPoolExecutor] = {}
+
+# Whether Sphinx reads the documents in parallel, in forked worker processes
+_sphinx_parallel = False
+
+# The minimum number of comments per chunk for transforming in parallel, below
+# which the overhead of the process pool is greater than the gains, see
+# bench/bench_transform.py
+_TRANSFORM_CHUNK_SIZE = 100
+
+
+def _get_executor(jobs):
+    executor = _executors.get(jobs)
+    if executor is None:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        _executors[jobs] = executor
+
+    return executor
+
+
+def _shutdown_executors():
+    for executor in _executors.values():
+        executor.shutdown()
+
+    _executors.clear()
+
+
+def _get_jobs(jobs):
+    # The Sphinx worker processes would start process pools of their own, and
+    # never shut them down, hanging the build. Leave the parallelism to Sphinx.
+    if _sphinx_parallel:
+        return 1
+
+    return jobs if jobs != 0 else os.cpu_count() or 1
+
+
+def _get_symbol_database(path):
+    global _symbol_database
+
+    # Reopen the database if it has changed, e.g. between incremental builds.
+    stamp = file_stamp(path)
+    if _symbol_database is None or _symbol_database[:2] != (path, stamp):
+        _symbol_database = (path, stamp, SymbolDatabase(path))
+
+    return _symbol_database[2]
+
+
+def _parse_timed(parse_fn, filename, timed, **kwargs):
+    timings = Timings() if timed else None
+
+    return parse_fn(filename, timings=timings, **kwargs), timings
+
+
+def _parse_files(filenames, domain, clang_args, cache, jobs, timed=False):
+    """Parse files, in a process pool if jobs > 1, and return results in order.
+
+    Return a list of (result, timings) tuples, where timings is None unless
+    timed is True.
+    """
+    jobs = _get_jobs(jobs)
+
+    kwargs = dict(timed=timed, domain=domain, clang_args=clang_args, cache=cache)
+
+    if jobs <= 1 or len(filenames) <= 1:
+        return [_parse_timed(_parse_session.parse, filename, **kwargs) for filename in filenames]
+
+    fn = functools.partial(_parse_timed, parse, **kwargs)
+
+    return list(_get_executor(jobs).map(fn, filenames))
+
+
+def transform_in_parallel(app, fn, batch, *args):
+    """Transform a batch of comments in chunks, in a process pool if configured.
+
+    Call ``fn(chunk, *args)`` for chunks of the batch, in
+    :data:`hawkmoth_transform_jobs` worker processes, and replace the comments
+    in the batch in-place with the results, in the original order. The fn must
+    return the transformed chunk. Small batches are transformed in the calling
+    process in one chunk.
+
+    The fn and args must be picklable, and fn must not depend on app or other
+    state of the Sphinx process.
+    """
+    jobs = _get_jobs(app.config.hawkmoth_transform_jobs)
+    chunk_size = max(_TRANSFORM_CHUNK_SIZE, -(-len(batch) // jobs))
+
+    if chunk_size >= len(batch):
+        results = [fn(batch, *args)]
+    else:
+        chunks = [batch[i : i + chunk_size] for i in range(0, len(batch), chunk_size)]
+        repeated_args = [itertools.repeat(arg) for arg in args]
+        results = _get_executor(jobs).map(fn, chunks, *repeated_args)
+
+    for lines, result in zip(batch, itertools.chain.from_iterable(results)):
+        lines[:] = result
+
 
 class _AutoBaseDirective(SphinxDirective, docstring.DocstringProcessor):
     logger = logging.getLogger(__name__)
@@ -40,6 +166,10 @@ class _AutoBaseDirective(SphinxDirective, docstring.DocstringProcessor):
     _domain: Optional[str] = None
     _docstring_types: Optional[list[type[docstring.Docstring]]] = None
 
+    # See hawkmoth_timings_report
+    _timings: Timings = NullTimings()
+    _file_timings: Optional[dict[str, dict]] = None
+
     def __display_parser_diagnostics(self, errors):
         # Map parser diagnostic level to Sphinx level name
         log_level_map = {
@@ -69,69 +199,220 @@ class _AutoBaseDirective(SphinxDirective, docstring.DocstringProcessor):
             clang_args.extend(self.options.get('clang', []))
             clang_args.extend(self.env.config._clang_args_post_cpp.copy())
 
+        # The symbol database has been parsed without the precompiled header.
+        if self.env.config.hawkmoth_pch and not self.env.config.hawkmoth_symbol_database:
+            clang_args.extend(self.__get_pch_args(clang_args))
+
         return clang_args
 
-    def __parse(self, filename):
+    def __get_pch_args(self, clang_args):
+        header = os.path.join(self.env.config.hawkmoth_root, self.env.config.hawkmoth_pch)
+        key = (header, self._domain, tuple(clang_args))
+
+        # Check the precompiled header only once per build
+        if key not in _pch_args:
+            cache_dir = self.env.config.hawkmoth_cache_dir
+            if not cache_dir:
+                cache_dir = os.path.join(self.env.doctreedir, 'hawkmoth')
+
+            pch_cache = PchCache(os.path.join(cache_dir, 'pch'))
+
+            args, errors = pch_cache.get_args(header, self._domain, clang_args)
+
+            self.__display_parser_diagnostics(errors)
+
+            _pch_args[key] = args
+
+        return _pch_args[key]
+
+    def __get_cache(self):
+        cache_dir = self.env.config.hawkmoth_cache_dir
+        if not cache_dir:
+            return None
+
+        return ParseCache(cache_dir, max_size=self.env.config.hawkmoth_cache_size)
+
+    def __get_symbol_database(self):
+        path = os.path.join(self.env.config.hawkmoth_root, self.env.config.hawkmoth_symbol_database)
+
+        # Tell Sphinx about the dependency
+        self.env.note_dependency(path)
+
+        try:
+            return _get_symbol_database(path)
+        except (OSError, ValueError) as e:
+            self.logger.error(
+                f'Failed to open symbol database: {e}', location=(self.env.docname, self.lineno)
+            )
+            return None
+
+    def __read_symbol_database(self, database, filename, clang_args):
+        result = None
+        if database is not None:
+            result = database.get(
+                filename,
+                self._domain,
+                root=self.env.config.hawkmoth_root,
+                clang_args=clang_args,
+            )
+
+        if result is None:
+            errors = []
+            if database is not None:
+                errors.append(
+                    ParserError(ErrorLevel.WARNING, filename, None, 'not found in symbol database')
+                )
+
+            result = docstring.RootDocstring(filename, self._domain, clang_args), errors
+
+        return result
+
+    def __parse(self, filenames):
         clang_args = self.__get_clang_args()
 
-        # Cached parse results per rst document
+        # Read the parse results from the symbol database instead of parsing
+        use_database = bool(self.env.config.hawkmoth_symbol_database)
+        database = self.__get_symbol_database() if use_database else None
+
+        # Parse results per rst document, for filtering
         parsed_files = self.env.temp_data.setdefault('hawkmoth_parsed_files', {})
 
-        # The output depends on domain and clang args
-        key = (filename, self._domain, tuple(clang_args))
+        # Parse results for this directive, in order, None for not parsed yet
+        results = {}
 
-        if key in parsed_files:
-            return
+        for filename in filenames:
+            # The output depends on domain and clang args
+            key = (filename, self._domain, tuple(clang_args))
 
-        # Tell Sphinx about the dependency
-        self.env.note_dependency(filename)
+            if key in parsed_files or key in results:
+                continue
 
-        docstrings, errors = parse(filename, domain=self._domain, clang_args=clang_args)
+            # Tell Sphinx about the dependency
+            self.env.note_dependency(filename)
 
-        self.__display_parser_diagnostics(errors)
+            if use_database:
+                results[key] = self.__read_symbol_database(database, filename, clang_args)
+            else:
+                # Parse results shared across documents
+                results[key] = _memory_cache.get(filename, self._domain, clang_args)
+
+                if results[key] is not None:
+                    self._timings.count('memory_cache.hits')
+                else:
+                    self._timings.count('memory_cache.misses')
+
+        unparsed = [filename for (filename, _, _), result in results.items() if result is None]
+
+        parsed = _parse_files(
+            unparsed,
+            domain=self._domain,
+            clang_args=clang_args,
+            cache=self.__get_cache(),
+            jobs=self.env.config.hawkmoth_parse_jobs,
+            timed=self._file_timings is not None,
+        )
+
+        for filename, (result, file_timings) in zip(unparsed, parsed):
+            _memory_cache.put(filename, self._domain, clang_args, result)
+            results[(filename, self._domain, tuple(clang_args))] = result
+
+            if file_timings is not None:
+                self._file_timings[filename] = file_timings.to_dict()
+
+        for key, (docstrings, errors) in results.items():
+            self.__display_parser_diagnostics(errors)
 
-        parsed_files[key] = docstrings
+            parsed_files[key] = docstrings
 
     def __parsed_files(self):
         parsed_files = self.env.temp_data.get('hawkmoth_parsed_files', {})
 
         return parsed_files.values()
 
-    def process_docstring(self, lines):
+    def __transform_is_pure(self):
+        listeners = [
+            listener
+            for event in ['hawkmoth-process-docstrings', 'hawkmoth-process-docstring']
+            for listener in self.env.events.listeners.get(event, [])
+        ]
+
+        return bool(listeners) and all(is_pure_transform(ls.handler) for ls in listeners)
+
+    def __emit_process_docstrings(self, batch, transform):
+        # The batch first, then one at a time for the handlers of the original event.
+        self.env.events.emit('hawkmoth-process-docstrings', batch, transform, self.options)
+
+        for lines in batch:
+            self.env.events.emit('hawkmoth-process-docstring', lines, transform, self.options)
+
+    def process_docstrings(self, batch):
         transform = self.options.get('transform', self.env.config.hawkmoth_transform_default)
 
-        self.env.events.emit('hawkmoth-process-docstring', lines, transform, self.options)
+        with self._timings.phase('transform'):
+            if not self.__transform_is_pure():
+                self.__emit_process_docstrings(batch, transform)
+                return
+
+            # The Sphinx configuration is covered by clearing the cache when
+            # it changes.
+            config = tuple(sorted((name, repr(value)) for name, value in self.options.items()))
+            fn = functools.partial(self.__emit_process_docstrings, transform=transform)
+
+            hits = _transform_cache.process_batch(fn, batch, transform, config)
+
+            self._timings.count('transform_cache.hits', hits)
+            self._timings.count('transform_cache.misses', len(batch) - hits)
 
-    def __add_docstring_to_viewlist(self, viewlist, root, ds):
-        lines, line_number = ds.get_docstring(processor=self)
-        for line in lines:
-            # viewlist line numbers are 0-based
-            viewlist.append(line, root.get_filename(), line_number - 1)
-            line_number += 1
+    def process_docstring(self, lines):
+        self.process_docstrings([lines])
+
+    def __add_docstrings_to_viewlist(self, viewlist, root, docstrings):
+        with self._timings.phase('render'):
+            results = docstring.get_docstrings(docstrings, processor=self)
+
+        self._timings.count('docstrings', len(docstrings))
+
+        for lines, line_number in results:
+            for line in lines:
+                # viewlist line numbers are 0-based
+                viewlist.append(line, root.get_filename(), line_number - 1)
+                line_number += 1
 
     @staticmethod
     def _skip(thing, iterable):
         return iterable is not None and thing not in iterable
 
     def __get_docstrings_for_root(self, viewlist, root):
+        names = self._get_names()
+        if names is not None:
+            # Look up named symbols from the index instead of checking them all.
+            primaries = root.find(names, types=self._docstring_types)
+        else:
+            primaries = root
+
+        # Process all the docstrings of the root in one batch.
+        docstrings = []
+
         num_matches = 0
-        for primary in root:
+        for primary in primaries:
             if self._skip(type(primary), self._docstring_types):
                 continue
 
-            if self._skip(primary.get_name(), self._get_names()):
-                continue
-
             num_matches += 1
 
-            self.__add_docstring_to_viewlist(viewlist, root, primary)
+            docstrings.append(primary)
+
+            members = self._get_members()
+            if members is not None:
+                members = primary.find(members)
+            else:
+                members = primary
 
-            for member in primary:
-                if self._skip(member.get_name(), self._get_members()):
-                    continue
+            for member in members:
+                docstrings.extend(member.walk())
 
-                for ds in member.walk():
-                    self.__add_docstring_to_viewlist(viewlist, root, ds)
+        if docstrings:
+            self.__add_docstrings_to_viewlist(viewlist, root, docstrings)
 
         return num_matches
 
@@ -191,17 +472,41 @@ class _AutoBaseDirective(SphinxDirective, docstring.DocstringProcessor):
     def _get_filenames(self):
         raise NotImplementedError(self.__class__.__name__ + '._get_filenames')
 
+    def __record_timings(self):
+        self.env.hawkmoth_timings.setdefault(self.env.docname, []).append(
+            {
+                'directive': self.name,
+                'arguments': ' '.join(self.arguments),
+                'line': self.lineno,
+                'phases': self._timings.to_dict()['phases'],
+                'counters': self._timings.counters,
+                'files': self._file_timings,
+            }
+        )
+
     def run(self):
-        if self._get_filenames():
-            for filename in self._get_filenames():
-                self.__parse(filename)
+        if self.env.config.hawkmoth_timings_report:
+            self._timings = Timings()
+            self._file_timings = {}
 
-        result = self.__get_docstrings()
+        filenames = self._get_filenames()
+        if filenames:
+            with self._timings.phase('parse'):
+                self.__parse(filenames)
+
+        # Note: This includes rendering and transforming the docstrings, but
+        # they are nested phases of their own.
+        with self._timings.phase('filter'):
+            result = self.__get_docstrings()
 
         # Parse the extracted reST
-        with switch_source_input(self.state, result):
-            node = nodes.section()
-            nested_parse_with_titles(self.state, result, node)
+        with self._timings.phase('nested_parse'):
+            with switch_source_input(self.state, result):
+                node = nodes.section()
+                nested_parse_with_titles(self.state, result, node)
+
+        if self._file_timings is not None:
+            self.__record_timings()
 
         return node.children
 
@@ -448,6 +753,105 @@ def _autoconf(app, config):
     logger.verbose(f'autoconf: Using C++ include args: {config._clang_args_post_cpp}')
 
 
+def _memory_cache_setup(app, config):
+    _memory_cache.set_max_size(config.hawkmoth_memory_cache_size)
+
+
+def _executors_setup(app, config):
+    global _sphinx_parallel
+
+    _sphinx_parallel = app.parallel > 1
+
+
+def _transform_cache_setup(app, config):
+    # The cached results depend on the configuration.
+    _transform_cache.clear()
+    _transform_cache.set_max_size(config.hawkmoth_transform_cache_size)
+
+
+def _timings_env_before_read_docs(app, env, docnames):
+    # Only report on the documents read in this build.
+    env.hawkmoth_timings = {}
+
+
+def _timings_env_purge_doc(app, env, docname):
+    if hasattr(env, 'hawkmoth_timings'):
+        env.hawkmoth_timings.pop(docname, None)
+
+
+def _timings_env_merge_info(app, env, docnames, other):
+    # Merge the timings from the parallel read worker processes.
+    for docname in docnames:
+        if docname in other.hawkmoth_timings:
+            env.hawkmoth_timings[docname] = other.hawkmoth_timings[docname]
+
+
+def _wall(phases):
+    return sum(phase['wall'] for phase in phases.values())
+
+
+def _timings_report(timings_by_doc):
+    """Aggregate the directive timings per document and per file, slowest first."""
+    documents = []
+    files = {}
+
+    for docname, doc_directives in timings_by_doc.items():
+        for directive in doc_directives:
+            directive['wall'] = _wall(directive['phases'])
+
+            for filename, file_timings in directive['files'].items():
+                f = files.setdefault(
+                    filename, {'file': filename, 'wall': 0.0, 'parses': 0, 'phases': {}}
+                )
+                f['wall'] += _wall(file_timings['phases'])
+                f['parses'] += 1
+
+                for name, phase in file_timings['phases'].items():
+                    totals = f['phases'].setdefault(name, {'wall': 0.0, 'cpu': 0.0})
+                    totals['wall'] += phase['wall']
+                    totals['cpu'] += phase['cpu']
+
+        documents.append(
+            {
+                'docname': docname,
+                'wall': sum(directive['wall'] for directive in doc_directives),
+                'directives': sorted(doc_directives, key=lambda d: d['wall'], reverse=True),
+            }
+        )
+
+    return {
+        'documents': sorted(documents, key=lambda d: d['wall'], reverse=True),
+        'files': sorted(files.values(), key=lambda f: f['wall'], reverse=True),
+    }
+
+
+def _write_timings_report(app):
+    logger = logging.getLogger(__name__)
+
+    report = _timings_report(getattr(app.env, 'hawkmoth_timings', {}))
+
+    path = os.path.join(app.outdir, app.config.hawkmoth_timings_report)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    logger.info(f'hawkmoth: timings report written to {path}')
+
+    for what, key, name in [('files', 'files', 'file'), ('documents', 'documents', 'docname')]:
+        if report[key]:
+            logger.info(f'hawkmoth: slowest {what}:')
+
+        for item in report[key][:5]:
+            logger.info(f'  {item["wall"]:8.3f} s  {item[name]}')
+
+
+def _build_finished(app, exception):
+    _shutdown_executors()
+    _pch_args.clear()
+
+    if exception is None and app.config.hawkmoth_timings_report:
+        _write_timings_report(app)
+
+
 def setup(app):
     app.require_sphinx('3.0')
 
@@ -460,6 +864,16 @@ def setup(app):
 
     app.add_config_value('hawkmoth_transform_default', None, 'env', [str, type(None)])
 
+    app.add_config_value('hawkmoth_cache_dir', None, '', [str, type(None)])
+    app.add_config_value('hawkmoth_cache_size', 512 * 1024 * 1024, '', [int])
+    app.add_config_value('hawkmoth_memory_cache_size', 256 * 1024 * 1024, '', [int])
+    app.add_config_value('hawkmoth_transform_cache_size', 4096, '', [int])
+    app.add_config_value('hawkmoth_parse_jobs', 1, '', [int])
+    app.add_config_value('hawkmoth_transform_jobs', 1, '', [int])
+    app.add_config_value('hawkmoth_pch', None, 'env', [str, type(None)])
+    app.add_config_value('hawkmoth_symbol_database', None, 'env', [str, type(None)])
+    app.add_config_value('hawkmoth_timings_report', None, '', [str, type(None)])
+
     app.add_directive_to_domain('c', 'autodoc', CAutoDocDirective)
     app.add_directive_to_domain('c', 'autosection', CAutoSectionDirective)
     app.add_directive_to_domain('c', 'autovar', CAutoVarDirective)
@@ -482,9 +896,19 @@ def setup(app):
     app.add_directive_to_domain('cpp', 'autoclass', CppAutoClassDirective)
 
     app.add_event('hawkmoth-process-docstring')
+    app.add_event('hawkmoth-process-docstrings')
 
     # Auto configure once during initialization, after Sphinx config type checks
     app.connect('config-inited', _autoconf, priority=850)
+    app.connect('config-inited', _memory_cache_setup)
+    app.connect('config-inited', _transform_cache_setup)
+    app.connect('config-inited', _executors_setup)
+    app.connect('build-finished', _build_finished)
+
+    # Timings report
+    app.connect('env-before-read-docs', _timings_env_before_read_docs)
+    app.connect('env-purge-doc', _timings_env_purge_doc)
+    app.connect('env-merge-info', _timings_env_merge_info)
 
     # Source code link
     app.add_config_value('hawkmoth_source_uri', None, 'env', [str, type(None)])
@@ -5,21 +5,29 @@ Hawkmoth parser debug tool
 ==========================
 
 python3 -m hawkmoth
+
+python3 -m hawkmoth extract
 """
 
 import argparse
+import concurrent.futures
+import functools
+import glob
+import json
 import os
 import sys
 
-from hawkmoth import docstring
+from hawkmoth import docstring, symboldb
+from hawkmoth.cache import TransformCache, is_pure_transform
 from hawkmoth.ext import javadoc, napoleon
-from hawkmoth.parser import parse
+from hawkmoth.parser import ParseSession
+from hawkmoth.util.timing import NullTimings, Timings
 
+# Parse session for the process, created on demand, also in worker processes
+_session = None
 
-def filename(file):
-    if os.path.isfile(file):
-        return file
-    raise ValueError
+# Transformed documentation comments for the process, also in worker processes
+_transform_cache = TransformCache()
 
 
 def _read_version():
@@ -35,38 +43,212 @@ def _read_version():
 
 
 class Processor(docstring.DocstringProcessor):
-    def __init__(self, transform):
+    def __init__(self, transform, timings=None, cache=None):
         self._transform = transform
+        self._timings = timings if timings is not None else NullTimings()
+        self._cache = cache
 
-    def process_docstring(self, lines):
+    def process_docstrings(self, batch):
         transformations = {
-            'napoleon': napoleon.process_docstring,
-            'javadoc': javadoc.process_docstring,
+            'napoleon': napoleon.process_docstrings,
+            'javadoc': javadoc.process_docstrings,
         }
 
         fn = transformations.get(self._transform)
-        if fn:
-            fn(lines)
+        if not fn:
+            return
 
+        with self._timings.phase('transform'):
+            if self._cache is None or not is_pure_transform(fn):
+                fn(batch)
+                return
 
-def main():
+            hits = self._cache.process_batch(fn, batch, self._transform)
+
+            self._timings.count('transform_cache.hits', hits)
+            self._timings.count('transform_cache.misses', len(batch) - hits)
+
+    def process_docstring(self, lines):
+        self.process_docstrings([lines])
+
+
+def _expand_files(parser, patterns):
+    """Expand file name patterns, in order, failing on patterns without matches."""
+    files = []
+    for pattern in patterns:
+        if os.path.isfile(pattern):
+            files.append(pattern)
+            continue
+
+        matches = sorted(f for f in glob.glob(pattern, recursive=True) if os.path.isfile(f))
+        if not matches:
+            parser.error(f'{pattern}: no such file')
+
+        files.extend(matches)
+
+    return files
+
+
+def _add_file_arguments(parser):
+    parser.add_argument(
+        'files',
+        metavar='FILE',
+        nargs='+',
+        help="""The C or C++ source or header files to parse. Glob patterns are
+        expanded. Use @FILELIST to read arguments from FILELIST, one per
+        line.""",
+    )
+    parser.add_argument(
+        '--domain', choices=['c', 'cpp'], default='c', help='Sphinx domain to be used.'
+    )
+    parser.add_argument(
+        '--clang',
+        metavar='PARAM',
+        action='append',
+        help='Argument to pass to Clang. May be specified multiple times. See hawkmoth_clang.',
+    )
+    parser.add_argument(
+        '--jobs',
+        '-j',
+        metavar='N',
+        type=int,
+        default=1,
+        help="""Number of worker processes to parse files in. Use 0 for the
+        number of CPUs. Defaults to 1.""",
+    )
+
+
+def _map(fn, items, jobs):
+    """Map items using fn, in a process pool if jobs > 1, yielding results in order."""
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs <= 1 or len(items) <= 1:
+        yield from map(fn, items)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(fn, items)
+
+
+def _parse(file, domain, clang_args, timings=None):
+    global _session
+
+    # Reuse the clang index across files.
+    if _session is None:
+        _session = ParseSession(max_translation_units=0)
+
+    return _session.parse(file, domain=domain, clang_args=clang_args, timings=timings)
+
+
+def _render(file, domain, clang_args, transform, verbose, timings):
+    # Measure in the process doing the work, possibly a worker process.
+    timings = Timings() if timings else NullTimings()
+
+    root, errors = _parse(file, domain, clang_args, timings)
+
+    processor = Processor(transform, timings, _transform_cache)
+
+    # Note: This includes evaluating the lazy docstring fields.
+    comments = list(root.walk())
+    with timings.phase('render'):
+        docstrings = docstring.get_docstrings(comments, processor=processor)
+
+    timings.count('docstrings', len(comments))
+
+    output = []
+    for comment, (lines, _) in zip(comments, docstrings):
+        if verbose:
+            output.append(f'# {comment.get_meta()}')
+
+        output.append('\n'.join(lines))
+
+    timings.update_peak_rss()
+
+    return output, errors, timings
+
+
+def _print_errors(errors):
+    for error in errors:
+        print(f'{error.level.name}: {error.get_message()}', file=sys.stderr)
+
+
+def _print_error_summary(files, errors_per_file):
+    summary = [
+        {
+            'file': file,
+            'errors': [
+                {
+                    'level': error.level.name,
+                    'filename': error.filename,
+                    'line': error.line,
+                    'message': error.message,
+                }
+                for error in errors
+            ],
+        }
+        for file, errors in zip(files, errors_per_file)
+    ]
+
+    print(json.dumps({'files': summary}, indent=2), file=sys.stderr)
+
+
+def _extract(argv):
     parser = argparse.ArgumentParser(
-        prog='hawkmoth',
+        prog='hawkmoth extract',
         description="""
-    Hawkmoth parser debug tool. Print the documentation comments extracted
-    from FILE, along with the generated C Domain directives, to standard
-    output. Include metadata with verbose output.""",
+    Extract the documentation comments from FILEs to a symbol database, for
+    the Sphinx extension to use instead of parsing the files. See
+    hawkmoth_symbol_database.""",
+        fromfile_prefix_chars='@',
     )
+    _add_file_arguments(parser)
     parser.add_argument(
-        'file',
-        metavar='FILE',
-        type=filename,
-        action='store',
-        help='The C or C++ source or header file to parse.',
+        '--output',
+        '-o',
+        metavar='DATABASE',
+        required=True,
+        help='The symbol database file to write.',
     )
     parser.add_argument(
-        '--domain', choices=['c', 'cpp'], default='c', help='Sphinx domain to be used.'
+        '--root',
+        metavar='DIR',
+        default='.',
+        help='The directory to store the file names relative to. See hawkmoth_root.',
+    )
+    args = parser.parse_args(argv)
+
+    files = _expand_files(parser, args.files)
+
+    fn = functools.partial(_parse, domain=args.domain, clang_args=args.clang)
+
+    # Write the results one file at a time, without keeping them all around.
+    def results():
+        for result in _map(fn, files, args.jobs):
+            _print_errors(result[1])
+
+            yield result
+
+    symboldb.write(args.output, results(), root=args.root)
+
+
+def main():
+    if sys.argv[1:2] == ['extract']:
+        _extract(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(
+        prog='hawkmoth',
+        description="""
+    Hawkmoth parser debug tool. Print the documentation comments extracted
+    from FILEs, along with the generated C Domain directives, to standard
+    output, one file after another. Include metadata with verbose output.""",
+        epilog="""
+    See 'hawkmoth extract --help' for extracting documentation comments to a
+    symbol database.""",
+        fromfile_prefix_chars='@',
     )
+    _add_file_arguments(parser)
     compat = parser.add_mutually_exclusive_group()
     compat.add_argument(
         '--process-docstring',
@@ -76,13 +258,24 @@ def main():
         ],
         help='Process docstring.',
     )
+    parser.add_argument('--verbose', dest='verbose', action='store_true', help='Verbose output.')
     parser.add_argument(
-        '--clang',
-        metavar='PARAM',
-        action='append',
-        help='Argument to pass to Clang. May be specified multiple times. See hawkmoth_clang.',
+        '--error-summary',
+        action='store_true',
+        help="""Print a summary of the errors in each file in JSON to standard
+        error at the end.""",
+    )
+    parser.add_argument(
+        '--timings',
+        choices=['text', 'json'],
+        nargs='?',
+        const='text',
+        help="""Print the wall and CPU time spent in each phase, counters, and
+        the peak memory usage, as text (the default) or JSON to standard error
+        at the end. The times are summed over all files and worker processes.
+        The docstring fields are evaluated lazily, so the render phase includes
+        much of the work on the cursors.""",
     )
-    parser.add_argument('--verbose', dest='verbose', action='store_true', help='Verbose output.')
     parser.add_argument(
         '--version',
         action='version',
@@ -91,18 +284,40 @@ def main():
     )
     args = parser.parse_args()
 
-    comments, errors = parse(args.file, domain=args.domain, clang_args=args.clang)
+    files = _expand_files(parser, args.files)
 
-    processor = Processor(args.process_docstring)
+    fn = functools.partial(
+        _render,
+        domain=args.domain,
+        clang_args=args.clang,
+        transform=args.process_docstring,
+        verbose=args.verbose,
+        timings=args.timings is not None,
+    )
 
-    for comment in comments.walk():
-        if args.verbose:
-            print(f'# {comment.get_meta()}')
-        lines, _ = comment.get_docstring(processor=processor)
-        print('\n'.join(lines))
+    timings = Timings()
 
-    for error in errors:
-        print(f'{error.level.name}: {error.get_message()}', file=sys.stderr)
+    # Stream the output of each file as soon as it and the files before it are
+    # done.
+    errors_per_file = []
+    for output, errors, file_timings in _map(fn, files, args.jobs):
+        for text in output:
+            print(text)
+
+        _print_errors(errors)
+
+        errors_per_file.append(errors)
+        timings.merge(file_timings)
+
+    if args.error_summary:
+        _print_error_summary(files, errors_per_file)
+
+    timings.update_peak_rss()
+
+    if args.timings == 'json':
+        print(json.dumps(timings.to_dict(), indent=2), file=sys.stderr)
+    elif args.timings == 'text':
+        print('\n'.join(timings.format()), file=sys.stderr)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,465 @@
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Parse result cache
+==================
+
+This module provides caches for the results of :func:`hawkmoth.parser.parse`,
+and for the results of transforming the documentation comments. This module
+does not depend on Sphinx.
+
+:class:`ParseCache` is a persistent, content addressed on-disk cache. The cache
+key covers everything that affects the parse result:
+
+* The name and the contents of the parsed file.
+
+* The domain and the clang arguments.
+
+* The libclang and Hawkmoth versions.
+
+Each cache entry also records the files included by the parsed file, and the
+entry is only used if none of them have changed since.
+
+:class:`PchCache` is a persistent on-disk cache of precompiled headers, built
+using :func:`hawkmoth.parser.build_pch`. The precompiled headers are rebuilt
+whenever the header, any of the files it includes, the domain, the clang
+arguments, or the libclang version change.
+
+:class:`MemoryCache` is an in-memory cache for sharing the parse results within
+a process, for example across all the documents in a Sphinx build. The entries
+are only used if the parsed file's modification time and size haven't changed
+since.
+
+The total size of :class:`ParseCache` and :class:`MemoryCache` is limited. The
+least recently used entries are evicted first when the limit is exceeded.
+
+:class:`TransformCache` is an in-memory cache for the transformed documentation
+comments, for transforms declared pure using :func:`pure_transform`. The number
+of entries is limited, and the least recently used entries are evicted first.
+"""
+
+import collections
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+from hawkmoth.docstring import Docstring
+from hawkmoth.parser import ErrorLevel, ParserError, build_pch, get_libclang_version
+from hawkmoth.util.fileutil import file_stamp, stamps_are_valid
+
+# Bump this whenever the cache entry format or the pickled classes change in an
+# incompatible way.
+_CACHE_FORMAT = 3
+
+_ENTRY_SUFFIX = '.pickle'
+
+
+def _read_version():
+    with open(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'VERSION')) as version_file:
+        return version_file.read().strip()
+
+
+def _atomic_pickle(path, *objs):
+    # Write atomically, as parallel builds may be using the same cache.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for obj in objs:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ParseCache:
+    """Persistent on-disk cache for parse results.
+
+    Args:
+        directory (str): The cache directory. Created if it doesn't exist.
+        max_size (int): The maximum total size of the cache entries in bytes.
+    """
+
+    def __init__(self, directory, max_size=512 * 1024 * 1024):
+        self._directory = directory
+        self._max_size = max_size
+        self._version = _read_version()
+
+    def _key(self, filename, domain, clang_args):
+        with open(filename, 'rb') as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+
+        # Whitespace around the arguments is not significant to clang, but the
+        # order of the arguments is.
+        normalized_args = [arg.strip() for arg in clang_args] if clang_args else []
+
+        key = repr(
+            (
+                _CACHE_FORMAT,
+                os.path.abspath(filename),
+                content_hash,
+                domain,
+                normalized_args,
+                get_libclang_version(),
+                self._version,
+            )
+        )
+
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self._directory, key[:2], key + _ENTRY_SUFFIX)
+
+    def get(self, filename, domain, clang_args):
+        """Get a cached ``(RootDocstring, errors)`` result, or None on a miss."""
+        try:
+            path = self._entry_path(self._key(filename, domain, clang_args))
+
+            with open(path, 'rb') as f:
+                if not stamps_are_valid(pickle.load(f)):
+                    return None
+
+                result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Update the access time for LRU eviction.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return result
+
+    def put(self, filename, domain, clang_args, result, dependencies):
+        """Store a ``(RootDocstring, errors)`` result in the cache.
+
+        The dependencies are the names of the files included by filename.
+        """
+        try:
+            path = self._entry_path(self._key(filename, domain, clang_args))
+            stamps = [(dependency, file_stamp(dependency)) for dependency in dependencies]
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            _atomic_pickle(path, stamps, result)
+        except OSError:
+            # Failing to cache is not fatal.
+            return
+
+        self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self._directory):
+            for f in files:
+                if not f.endswith(_ENTRY_SUFFIX):
+                    continue
+
+                path = os.path.join(root, f)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+
+                yield st.st_mtime_ns, st.st_size, path
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+
+        # Remove the least recently used entries first.
+        for _, size, path in entries:
+            if total_size <= self._max_size:
+                break
+
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+            total_size -= size
+
+
+class PchCache:
+    """Persistent on-disk cache for precompiled headers.
+
+    Args:
+        directory (str): The cache directory. Created if it doesn't exist.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def _key(self, header, domain, clang_args):
+        normalized_args = [arg.strip() for arg in clang_args] if clang_args else []
+
+        key = repr(
+            (
+                _CACHE_FORMAT,
+                os.path.abspath(header),
+                domain,
+                normalized_args,
+                get_libclang_version(),
+            )
+        )
+
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get_args(self, header, domain, clang_args):
+        """Get the clang arguments for using a precompiled header.
+
+        Build the precompiled header from header first, if needed.
+
+        Return a list of clang arguments, empty if the precompiled header could
+        not be built, and a list of errors.
+        """
+        key = self._key(header, domain, clang_args)
+        index_path = os.path.join(self._directory, key + '.deps')
+
+        try:
+            with open(index_path, 'rb') as f:
+                stamps, pch_name = pickle.load(f)
+
+            pch_path = os.path.join(self._directory, pch_name)
+            if stamps_are_valid(stamps) and os.path.isfile(pch_path):
+                return ['-include-pch', pch_path], []
+
+            old_pch_path = pch_path
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            old_pch_path = None
+
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+
+            fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+            os.close(fd)
+
+            try:
+                errors, dependencies = build_pch(header, domain, clang_args, tmp_path)
+                if not dependencies:
+                    return [], errors
+
+                stamps = [(dependency, file_stamp(dependency)) for dependency in dependencies]
+
+                # Name the precompiled header after its inputs, so that the
+                # clang arguments for using it change whenever it's rebuilt.
+                stamps_hash = hashlib.sha256(repr(stamps).encode()).hexdigest()
+                pch_name = f'{key}-{stamps_hash[:16]}.pch'
+                pch_path = os.path.join(self._directory, pch_name)
+
+                os.replace(tmp_path, pch_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+            _atomic_pickle(index_path, (stamps, pch_name))
+
+            if old_pch_path and old_pch_path != pch_path and os.path.exists(old_pch_path):
+                os.unlink(old_pch_path)
+        except OSError as e:
+            return [], [ParserError(ErrorLevel.WARNING, header, None, str(e))]
+
+        return ['-include-pch', pch_path], errors
+
+
+def _deep_sizeof(obj, seen):
+    """Estimate the memory footprint of a docstring tree or parse result."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif isinstance(obj, Docstring):
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                size += _deep_sizeof(getattr(obj, name, None), seen)
+
+        if hasattr(obj, '__dict__'):
+            size += _deep_sizeof(vars(obj), seen)
+
+    return size
+
+
+class MemoryCache:
+    """In-memory cache for parse results.
+
+    Args:
+        max_size (int): The approximate maximum total memory footprint of the
+            cached parse results in bytes.
+    """
+
+    def __init__(self, max_size=256 * 1024 * 1024):
+        self._max_size = max_size
+        self._total_size = 0
+        # key -> (stamp, size, result) in least recently used first order
+        self._entries = collections.OrderedDict()
+
+    def set_max_size(self, max_size):
+        self._max_size = max_size
+        self._evict()
+
+    @staticmethod
+    def _key(filename, domain, clang_args):
+        return (filename, domain, tuple(clang_args) if clang_args else ())
+
+    def get(self, filename, domain, clang_args):
+        """Get a cached ``(RootDocstring, errors)`` result, or None on a miss."""
+        key = self._key(filename, domain, clang_args)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stamp, _, result = entry
+
+        try:
+            if file_stamp(filename) != stamp:
+                return None
+        except OSError:
+            return None
+
+        self._entries.move_to_end(key)
+
+        return result
+
+    def put(self, filename, domain, clang_args, result):
+        """Store a ``(RootDocstring, errors)`` result in the cache."""
+        key = self._key(filename, domain, clang_args)
+
+        try:
+            stamp = file_stamp(filename)
+        except OSError:
+            return
+
+        self._remove(key)
+
+        size = _deep_sizeof(result, set())
+
+        self._entries[key] = (stamp, size, result)
+        self._total_size += size
+
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self._total_size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_size -= entry[1]
+
+    def _evict(self):
+        while self._entries and self._total_size > self._max_size:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._total_size -= size
+
+
+def pure_transform(fn):
+    """Declare a transform function or event handler pure, and safe to cache.
+
+    The result of a pure transform only depends on the lines, the transform
+    name, and the transform configuration, such as the directive options and
+    the Sphinx configuration.
+    """
+    fn.hawkmoth_pure_transform = True
+
+    return fn
+
+
+def is_pure_transform(fn):
+    """Check if a transform function or event handler has been declared pure."""
+    return getattr(fn, 'hawkmoth_pure_transform', False)
+
+
+class TransformCache:
+    """In-memory cache for transformed documentation comments.
+
+    The cache key covers the transform name, the transform configuration, which
+    must be hashable, and a hash of the lines.
+
+    Args:
+        max_size (int): The maximum number of cached results.
+    """
+
+    def __init__(self, max_size=4096):
+        self._max_size = max_size
+        # key -> transformed lines in least recently used first order
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def set_max_size(self, max_size):
+        self._max_size = max_size
+        self._evict()
+
+    @staticmethod
+    def _key(transform, config, lines):
+        # The lines don't have newlines, but the number of lines matters.
+        digest = hashlib.blake2b('\n'.join(lines).encode(), digest_size=16).digest()
+
+        return (transform, config, len(lines), digest)
+
+    def process(self, fn, lines, transform, config=None):
+        """Transform lines in-place using fn(lines), or using a cached result.
+
+        Return True on a cache hit, False otherwise.
+        """
+        return self.process_batch(lambda batch: fn(batch[0]), [lines], transform, config) == 1
+
+    def process_batch(self, fn, batch, transform, config=None):
+        """Transform a batch of lines in-place using fn(batch), or using cached results.
+
+        Only the lines not found in the cache are passed to fn, and identical
+        lines only once. Return the number of cache hits, including the
+        identical lines.
+        """
+        if self._max_size <= 0:
+            fn(batch)
+            return 0
+
+        # key -> list of identical lines not found in the cache
+        misses = {}
+        for lines in batch:
+            key = self._key(transform, config, lines)
+
+            result = self._entries.get(key)
+            if result is None:
+                misses.setdefault(key, []).append(lines)
+                continue
+
+            self._entries.move_to_end(key)
+            lines[:] = result
+
+        if misses:
+            fn([identical[0] for identical in misses.values()])
+
+            for key, identical in misses.items():
+                result = tuple(identical[0])
+                for lines in identical[1:]:
+                    lines[:] = result
+
+                self._entries[key] = result
+
+            self._evict()
+
+        hits = len(batch) - len(misses)
+
+        self.hits += hits
+        self.misses += len(misses)
+
+        return hits
+
+    def clear(self):
+        self._entries.clear()
+
+    def _evict(self):
+        while len(self._entries) > max(self._max_size, 0):
+            self._entries.popitem(last=False)
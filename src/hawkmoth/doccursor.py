@@ -2,6 +2,11 @@
 # SPDX-FileCopyrightText: 2018 Bruno Santos <brunomanuelsantos@tecnico.ulisboa.pt>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import bisect
+import functools
+import weakref
+from ctypes import POINTER, byref, c_uint, cast
+
 from clang.cindex import (
     AccessSpecifier,
     CursorKind,
@@ -11,26 +16,177 @@ from clang.cindex import (
     StorageClass,
     TokenKind,
     TypeKind,
+    conf,
 )
+from clang.cindex import Token as ClangToken
+
 
+def _get_namespace(cursor, namespaces):
+    """Get the nested namespaces of cursor, if cursor is a namespace.
 
-def _get_semantic_parent_namespace(cursor, namespace):
-    semantic_parent = cursor.semantic_parent
-    if not semantic_parent:
-        return namespace
+    Use and update namespaces, the cache of namespaces by cursor hash.
+    """
+    key = cursor.hash
+    if key in namespaces:
+        return namespaces[key]
+
+    namespace = None
+    if cursor.kind == CursorKind.NAMESPACE:
+        # cursor is a namespace => add enclosing namespaces in front
+        semantic_parent = cursor.semantic_parent
+        if semantic_parent:
+            namespace = _get_namespace(semantic_parent, namespaces)
 
-    if semantic_parent.kind == CursorKind.NAMESPACE:
-        # parent is a namespace => add namespace in front
         if namespace is not None:
-            namespace = f'{semantic_parent.spelling}::{namespace}'
+            namespace = f'{namespace}::{cursor.spelling}'
         else:
-            namespace = semantic_parent.spelling
-        # check again for nested namespaces
-        return _get_semantic_parent_namespace(semantic_parent, namespace)
+            namespace = cursor.spelling
+
+    namespaces[key] = namespace
 
     return namespace
 
 
+class _LazySequence:
+    """Sequence of values evaluated on demand by index, and memoized."""
+
+    def __init__(self, length, fn):
+        self._fn = fn
+        self._values = [None] * length
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, i):
+        value = self._values[i]
+        if value is None:
+            value = self._values[i] = self._fn(i)
+
+        return value
+
+
+class Token:
+    """Lightweight token in FileTokens.
+
+    The kind and the spelling are evaluated on demand, and memoized in
+    FileTokens.
+    """
+
+    __slots__ = ('_index', '_tokens')
+
+    def __init__(self, tokens, index):
+        self._tokens = tokens
+        self._index = index
+
+    @property
+    def kind(self):
+        return self._tokens._kinds[self._index]
+
+    @property
+    def spelling(self):
+        return self._tokens._spellings[self._index]
+
+    @property
+    def offset(self):
+        """The offset of the token in the file."""
+        return self._tokens._offsets[self._index]
+
+
+class FileTokens:
+    """The tokens of a file, or a part of it, for looking up cursor tokens.
+
+    The file is tokenized only once, and the tokens of a cursor are looked up by
+    bisecting on the token offsets. The token kinds and spellings are only
+    evaluated when needed.
+
+    The tokens are kept in the array allocated by libclang, and Clang tokens
+    are only created on access, as keeping a Python object around for each
+    token is expensive for large files.
+
+    Args:
+        tu (TranslationUnit): The translation unit.
+        extent (SourceRange): The extent to tokenize.
+    """
+
+    def __init__(self, tu, extent):
+        self._tu = tu
+        self._filename = extent.start.file.name if extent.start.file else None
+
+        memory = POINTER(ClangToken)()
+        count = c_uint()
+        conf.lib.clang_tokenize(tu, extent, byref(memory), byref(count))
+        count = count.value
+
+        if count > 0:
+            self._array = cast(memory, POINTER(ClangToken * count)).contents
+            weakref.finalize(self, conf.lib.clang_disposeTokens, tu, memory, count)
+        else:
+            self._array = []
+
+        self._offsets = self._get_offsets()
+        self._kinds = _LazySequence(count, lambda i: self[i].kind)
+        self._spellings = _LazySequence(count, lambda i: self[i].spelling)
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, i):
+        """Get the Clang token at index i."""
+        # Copy the token, so that it remains valid after the array is disposed.
+        src = self._array[i]
+
+        token = ClangToken()
+        token.int_data = src.int_data
+        token.ptr_data = src.ptr_data
+        token._tu = self._tu
+
+        return token
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _get_offsets(self):
+        if len(self) == 0:
+            return []
+
+        # Getting the offset of every token through the Python bindings is
+        # expensive. libclang stores the raw encoding of the token location in
+        # the token, and for tokens in the same file, it's the file offset plus
+        # a constant. Check the assumption at both ends, and fall back to the
+        # bindings if it doesn't hold.
+        first, last = self[0], self[len(self) - 1]
+        base = first.int_data[1] - first.location.offset
+
+        if last.int_data[1] - base == last.location.offset:
+            return [token.int_data[1] - base for token in self._array]
+
+        return _LazySequence(len(self), lambda i: self[i].location.offset)
+
+    def get_range(self, extent):
+        """Get the range of the indexes of the tokens within extent.
+
+        Return None if extent is not within the tokenized file.
+        """
+        start, end = extent.start, extent.end
+
+        if start.file is None or start.file.name != self._filename:
+            return None
+
+        first = bisect.bisect_left(self._offsets, start.offset)
+        last = bisect.bisect_left(self._offsets, end.offset, lo=first)
+
+        return range(first, last)
+
+    def get_tokens(self, token_range=None):
+        """Get the tokens in a range of indexes, or all of them."""
+        if token_range is None:
+            token_range = range(len(self))
+
+        for i in token_range:
+            yield Token(self, i)
+
+
 class DocCursor:
     """Documentation centric wrapper for Clang's own ``Cursor``.
 
@@ -43,8 +199,13 @@ class DocCursor:
     won't expose any relevant information for those.
     """
 
-    def __init__(self, domain=None, cursor=None, comments=None):
+    def __init__(self, domain=None, cursor=None, comments=None, tokens=None, namespaces=None):
         self._comments = comments if comments else {}
+        self._tokens = tokens
+        # Namespaces by cursor hash, shared by all the cursors of a parse
+        self._namespaces = namespaces if namespaces is not None else {}
+        # (FileTokens, token index range) for get_tokens(), on demand
+        self._token_range = None
         self._cc = cursor
         self._domain = domain
 
@@ -60,9 +221,9 @@ class DocCursor:
     def meta(self):
         return {
             'line': self.line,
-            'cursor.kind': self._cc.kind,
-            'cursor.displayname': self._cc.displayname,
-            'cursor.spelling': self._cc.spelling,
+            'cursor.kind': self.kind,
+            'cursor.displayname': self.displayname,
+            'cursor.spelling': self.spelling,
         }
 
     @property
@@ -81,6 +242,14 @@ class DocCursor:
     def kind(self):
         return self._cc.kind
 
+    @property
+    def displayname(self):
+        return self._cc.displayname
+
+    @property
+    def spelling(self):
+        return self._cc.spelling
+
     @property
     def name(self):
         return self.namespace_prefix + self._cc.spelling if self._cc.spelling else self.decl_name
@@ -88,7 +257,7 @@ class DocCursor:
     @property
     def decl_name(self):
         if self._cc.kind in [CursorKind.VAR_DECL, CursorKind.FIELD_DECL]:
-            return self._var_type_fixup(self)[1]
+            return self._var_type[1]
         if self._cc.kind in [
             CursorKind.STRUCT_DECL,
             CursorKind.UNION_DECL,
@@ -102,17 +271,20 @@ class DocCursor:
             # self.name would recurse back here if self._cc.spelling is None
             return self.namespace_prefix + self._cc.spelling if self._cc.spelling else None
 
-    @property
+    @functools.cached_property
     def namespace_prefix(self):
         if self.domain != 'cpp':
             return ''
-        namespace = _get_semantic_parent_namespace(self._cc, None)
+        semantic_parent = self._cc.semantic_parent
+        if not semantic_parent:
+            return ''
+        namespace = _get_namespace(semantic_parent, self._namespaces)
         return f'{namespace}::' if namespace else ''
 
     @property
     def type(self):
         if self._cc.kind in [CursorKind.VAR_DECL, CursorKind.FIELD_DECL]:
-            return self._var_type_fixup(self)[0]
+            return self._var_type[0]
 
         if self._cc.kind == CursorKind.FUNCTION_DECL:
             return self._function_fixup()
@@ -172,7 +344,7 @@ class DocCursor:
     def is_scoped_enum(self):
         return self._cc.is_scoped_enum()
 
-    @property
+    @functools.cached_property
     def is_function_pointer_typedef(self):
         canonical = self._cc.type.get_canonical()
         if canonical.kind != TypeKind.POINTER:
@@ -199,6 +371,10 @@ class DocCursor:
 
     def get_children(self):
         """Get children cursors."""
+        return iter(self._child_cursors)
+
+    @functools.cached_property
+    def _child_cursors(self):
         domain = self.domain
 
         # Identify `extern "C"` blocks and change domain accordingly.
@@ -212,8 +388,16 @@ class DocCursor:
                 if ntoken and ntoken.spelling == '"C"':
                     domain = 'c'
 
-        for c in self._cc.get_children():
-            yield DocCursor(domain=domain, cursor=c, comments=self._comments)
+        return [
+            DocCursor(
+                domain=domain,
+                cursor=c,
+                comments=self._comments,
+                tokens=self._tokens,
+                namespaces=self._namespaces,
+            )
+            for c in self._cc.get_children()
+        ]
 
     def get_tokens(self):
         """Get cursor tokens.
@@ -226,7 +410,21 @@ class DocCursor:
         extent and getting the tokens from the translation unit works fine. The
         `__repr__` for both the recreated and original extents is the same, but
         comparison indicates they do differ under the hood.
+
+        The tokens are looked up from the tokens of the whole file, if
+        available, instead of tokenizing again.
         """
+        if self._token_range is None:
+            self._token_range = self._get_token_range()
+
+        return self._token_range[0].get_tokens(self._token_range[1])
+
+    def _get_token_range(self):
+        if self._tokens is not None:
+            token_range = self._tokens.get_range(self._cc.extent)
+            if token_range is not None:
+                return self._tokens, token_range
+
         tu = self._cc.translation_unit
 
         start = self._cc.extent.start
@@ -237,7 +435,7 @@ class DocCursor:
 
         extent = SourceRange.from_locations(start, end)
 
-        yield from tu.get_tokens(extent=extent)
+        return FileTokens(tu, extent), None
 
     def _get_fn_args(self):
         """Get function / method / function pointer typedef arguments."""
@@ -247,7 +445,7 @@ class DocCursor:
         if self._cc.type.kind == TypeKind.FUNCTIONPROTO or self.is_function_pointer_typedef:
             for c in self.get_children():
                 if c._cc.kind == CursorKind.PARM_DECL:
-                    arg_ttype, arg_name = self._var_type_fixup(c)
+                    arg_ttype, arg_name = c._var_type
                     args.extend([(arg_ttype, arg_name)])
 
             if not self.is_function_pointer_typedef and self._cc.type.is_function_variadic():
@@ -350,7 +548,11 @@ class DocCursor:
         # *without* a space before the paren.
         identifier = next(tokens)
         paren = next(tokens, None)
-        if paren is None or identifier.extent.end != paren.extent.start or paren.spelling != '(':
+        if (
+            paren is None
+            or identifier.offset + len(identifier.spelling) != paren.offset
+            or paren.spelling != '('
+        ):
             return None
 
         # Naïve parsing of macro arguments
@@ -605,6 +807,10 @@ class DocCursor:
     def _normalize_type(type_string):
         return 'bool' if type_string == '_Bool' else type_string
 
+    @functools.cached_property
+    def _var_type(self):
+        return self._var_type_fixup(self)
+
     @staticmethod
     def _var_type_fixup(cursor):
         """Fix non trivial variable and argument types.
@@ -657,7 +863,7 @@ class DocCursor:
             args = []
             for c in cursor.get_children():
                 if c._cc.kind == CursorKind.PARM_DECL:
-                    arg_ttype, arg_name = cursor._var_type_fixup(c)
+                    arg_ttype, arg_name = c._var_type
                     args.append(f'{pad(arg_ttype)}{arg_name}' if arg_name else arg_ttype)
             if cursor_type.is_function_variadic():
                 args.append('...')
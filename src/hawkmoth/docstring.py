@@ -22,9 +22,12 @@ conversions:
 * Generation of Sphinx C Domain directives with appropriate indentation.
 """
 
+import functools
 import hashlib
+import operator
 import os
 import re
+import sys
 
 from docutils import statemachine
 
@@ -53,6 +56,15 @@ class DocstringProcessor:
     def process_docstring(self, lines):
         pass
 
+    def process_docstrings(self, batch):
+        """Process a batch of comments, each a list of lines, in-place.
+
+        By default, process the comments one at a time using
+        process_docstring(). Override to process them all in one go.
+        """
+        for lines in batch:
+            self.process_docstring(lines)
+
     def remove_comment_markers(self, lines):
         """Remove comment markers and line prefixes from comment lines.
 
@@ -88,36 +100,231 @@ class DocstringProcessor:
         lines[:] = ['   ' * nest + line if line else '' for line in lines]
 
 
+def _intern(value):
+    """Intern strings, also in sequences, to share the repeated ones."""
+    if isinstance(value, str):
+        return sys.intern(value)
+
+    if isinstance(value, (list, tuple)):
+        return tuple(_intern(v) for v in value)
+
+    return value
+
+
+class _CursorField:
+    """Docstring field evaluated lazily from the cursor, and memoized.
+
+    The value is stored in the slot named after the field with a ``_value``
+    suffix, which must be declared in the same class. The slot is unset until
+    the value is evaluated or set. Without a cursor, the value is None.
+
+    Args:
+        attr (str): The DocCursor attribute to evaluate.
+        intern (bool): Intern the strings in the value.
+    """
+
+    def __init__(self, attr, intern=False):
+        self._get = operator.attrgetter(attr)
+        self.intern = intern
+
+    def __set_name__(self, owner, name):
+        self.slot_name = f'{name}_value'
+        self._slot = owner.__dict__[self.slot_name]
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        try:
+            return self._slot.__get__(instance, owner)
+        except AttributeError:
+            pass
+
+        cursor = instance._cursor
+        value = self._get(cursor) if cursor is not None else None
+
+        if self.intern:
+            value = _intern(value)
+
+        self._slot.__set__(instance, value)
+
+        return value
+
+    def __set__(self, instance, value):
+        self._slot.__set__(instance, value)
+
+
+@functools.lru_cache(maxsize=None)
+def _cursor_fields(cls):
+    return tuple(
+        value
+        for klass in cls.__mro__
+        for value in vars(klass).values()
+        if isinstance(value, _CursorField)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _slot_names(cls):
+    return tuple(
+        name
+        for klass in cls.__mro__
+        for name in getattr(klass, '__slots__', ())
+        if name != '__weakref__'
+    )
+
+
+_MISSING = object()
+
+
 class Docstring:
     _indent = 0
     _fmt = ''
 
-    def __init__(self, cursor, nest):
-        if cursor:
-            self._args = cursor.args
-            self._decl_name = cursor.decl_name
-            self._domain = cursor.domain
-            self._meta = cursor.meta
-            self._name = cursor.name
-            self._quals = cursor.quals
-            self._text = cursor.comment
-            self._ttype = cursor.type
-        else:
-            self._args = None
-            self._decl_name = None
-            self._domain = None
-            self._meta = None
-            self._name = None
-            self._quals = None
-            self._text = None
-            self._ttype = None
+    # Use slots instead of instance dicts, as there may be a very large number
+    # of docstrings.
+    __slots__ = (
+        '_args_value',
+        '_children',
+        '_cursor',
+        '_decl_name_value',
+        '_displayname_value',
+        '_domain',
+        '_index',
+        '_kind_value',
+        '_line_value',
+        '_name_value',
+        '_nest',
+        '_parent',
+        '_quals_value',
+        '_spelling_value',
+        '_text_value',
+        '_ttype_value',
+    )
+
+    # The fields are only evaluated from the cursor when needed. The cursor
+    # keeps the translation unit alive until materialize() is called.
+    _args = _CursorField('args', intern=True)
+    _decl_name = _CursorField('decl_name', intern=True)
+    _name = _CursorField('name', intern=True)
+    _quals = _CursorField('quals', intern=True)
+    _text = _CursorField('comment')
+    _ttype = _CursorField('type', intern=True)
+
+    # The meta fields, see get_meta()
+    _line = _CursorField('line')
+    _kind = _CursorField('kind')
+    _displayname = _CursorField('displayname', intern=True)
+    _spelling = _CursorField('spelling', intern=True)
 
+    def __init__(self, cursor, nest):
+        self._cursor = cursor
+        self._domain = _intern(cursor.domain) if cursor else None
         self._nest = nest
-        self._children = []
+        # Leaves share the empty tuple, see _CompoundDocstring
+        self._children = ()
+        self._parent = None
+        # Children by name, built on demand
+        self._index = None
+
+    def materialize(self):
+        """Evaluate all the fields, and release the cursor, recursively.
+
+        This must be called before the translation unit the docstrings were
+        parsed from is modified, e.g. reparsed. The docstrings no longer keep
+        the translation unit alive afterwards.
+        """
+        if self._cursor is not None:
+            for field in _cursor_fields(type(self)):
+                field.__get__(self)
+
+            self._cursor = None
+
+        for child in self._children:
+            child.materialize()
+
+    def __getstate__(self):
+        # Cursors can't be pickled.
+        if self._cursor is not None:
+            for field in _cursor_fields(type(self)):
+                field.__get__(self)
+
+        state = {}
+        for name in _slot_names(type(self)):
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                state[name] = value
+
+        state['_cursor'] = None
+
+        # Pickle subtrees without their parents, see __setstate__().
+        del state['_parent']
+
+        # The index and the walk are rebuilt on demand.
+        state['_index'] = None
+        if '_walk' in state:
+            state['_walk'] = None
+
+        # Clang enumerations do not necessarily survive pickling as the
+        # singletons they are, so store the cursor kind by value.
+        kind = state.get('_kind_value')
+        if kind is not None:
+            state['_kind_value'] = (type(kind), kind.value)
+
+        return state
+
+    def __setstate__(self, state):
+        kind = state.get('_kind_value')
+        if kind is not None:
+            kind_type, kind_value = kind
+            state['_kind_value'] = kind_type.from_id(kind_value)
+
+        # Share the strings across the unpickled docstrings.
+        interned = {field.slot_name for field in _cursor_fields(type(self)) if field.intern}
+        interned.add('_domain')
+
+        self._parent = None
+
+        for name, value in state.items():
+            setattr(self, name, _intern(value) if name in interned else value)
+
+        # The children have been unpickled already.
+        for child in self._children:
+            child._parent = self
 
     def __iter__(self):
-        # Sort the children by order of appearance.
-        yield from sorted(self._children, key=lambda c: c.get_line())
+        # The children are kept in order of appearance, see add_child().
+        return iter(self._children)
+
+    def _get_index(self):
+        if self._index is None:
+            index = {}
+            for position, child in enumerate(self):
+                index.setdefault(child.get_name(), []).append((position, child))
+
+            self._index = index
+
+        return self._index
+
+    def find(self, names, types=None):
+        """Iterate over the children with any of the names, in order of appearance.
+
+        Optionally only include the children that are instances of any of the
+        types, exactly.
+        """
+        index = self._get_index()
+
+        matches = []
+        for name in dict.fromkeys(names):
+            for position, child in index.get(name, ()):
+                if types is None or type(child) in types:
+                    matches.append((position, child))
+
+        if len(matches) > 1:
+            matches.sort(key=operator.itemgetter(0))
+
+        for _, child in matches:
+            yield child
 
     def walk(self):
         # The contents of the parent will always be before children.
@@ -143,13 +350,15 @@ class Docstring:
     def _get_comment_lines(self):
         return statemachine.string2lines(self._text, 8, convert_whitespace=True)
 
-    def get_docstring(self, processor):
-        header_lines = self._get_header_lines()
+    def _get_comment(self, processor):
         comment_lines = self._get_comment_lines()
 
         line_offset = processor.remove_comment_markers(comment_lines)
 
-        processor.process_docstring(comment_lines)
+        return comment_lines, line_offset
+
+    def _get_docstring(self, processor, comment_lines, line_offset):
+        header_lines = self._get_header_lines()
 
         processor.nest_lines(comment_lines, self._indent)
 
@@ -173,8 +382,26 @@ class Docstring:
 
         return lines, self.get_line() + line_offset
 
+    def get_docstring(self, processor):
+        comment_lines, line_offset = self._get_comment(processor)
+
+        processor.process_docstring(comment_lines)
+
+        return self._get_docstring(processor, comment_lines, line_offset)
+
     def get_meta(self):
-        return self._meta
+        if self._kind is not None:
+            return {
+                'line': self._line,
+                'cursor.kind': self._kind,
+                'cursor.displayname': self._displayname,
+                'cursor.spelling': self._spelling,
+            }
+
+        if self._line is not None:
+            return {'line': self._line}
+
+        return None
 
     def _get_decl_name(self):
         return self._decl_name if self._decl_name else self._name
@@ -183,17 +410,24 @@ class Docstring:
         return self._name
 
     def get_line(self):
-        return self._meta['line']
+        return self._line
 
 
 class TextDocstring(Docstring):
+    __slots__ = ()
+
     _indent = 0
     _fmt = ''
 
     def __init__(self, text, meta):
         super().__init__(cursor=None, nest=0)
         self._text = text
-        self._meta = meta
+        self._line = meta.get('line')
+
+        if 'cursor.kind' in meta:
+            self._kind = meta['cursor.kind']
+            self._displayname = _intern(meta['cursor.displayname'])
+            self._spelling = _intern(meta['cursor.spelling'])
 
     def get_name(self):
         """Figure out a name for the text comment based on the comment contents.
@@ -226,6 +460,8 @@ class TextDocstring(Docstring):
 
 
 class VarDocstring(Docstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. {domain}:var:: {ttype}{type_spacer}{name}'
 
@@ -244,11 +480,15 @@ class VarDocstring(Docstring):
 
 
 class TypedefDocstring(Docstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. {domain}:type:: {name}'
 
 
 class TypedefFunctionDocstring(Docstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. {domain}:type:: {ttype}{type_spacer}(*{name})({args})'
 
@@ -280,16 +520,16 @@ class TypedefFunctionDocstring(Docstring):
 
 
 class TypeAliasDocstring(Docstring):
+    __slots__ = ('_underlying_type_value',)
+
     _indent = 1
     _fmt = '.. cpp:type:: {name} = {underlying_type}'
 
-    def __init__(self, cursor, nest):
-        self._underlying_type = cursor.value
-        super().__init__(cursor=cursor, nest=nest)
+    _underlying_type = _CursorField('value.spelling', intern=True)
 
     def _get_header_lines(self):
         name = self._get_decl_name()
-        underlying_type = self._underlying_type.spelling
+        underlying_type = self._underlying_type
 
         header = self._fmt.format(name=name, underlying_type=underlying_type)
 
@@ -297,6 +537,14 @@ class TypeAliasDocstring(Docstring):
 
 
 class _CompoundDocstring(Docstring):
+    __slots__ = ('_walk',)
+
+    def __init__(self, cursor, nest):
+        super().__init__(cursor=cursor, nest=nest)
+        self._children = []
+        # Flattened walk(), built on demand
+        self._walk = None
+
     def _get_decl_name(self):
         # If decl_name is empty, it means this is an anonymous declaration.
         if self._decl_name is None:
@@ -308,14 +556,59 @@ class _CompoundDocstring(Docstring):
 
         return self._decl_name
 
+    def walk(self):
+        # Cache the walk, as trees may be walked many times.
+        if self._walk is None:
+            self._walk = tuple(super().walk())
+
+        return iter(self._walk)
+
+    def _insert_child(self, comment):
+        # Keep the children sorted by order of appearance. Equal lines retain
+        # the order of insertion. The comments are mostly added in order.
+        children = self._children
+        line = comment.get_line()
+
+        if not children or line >= children[-1].get_line():
+            children.append(comment)
+        else:
+            # bisect.insort_right() doesn't support key before Python 3.10.
+            lo, hi = 0, len(children)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if line < children[mid].get_line():
+                    hi = mid
+                else:
+                    lo = mid + 1
+
+            children.insert(lo, comment)
+
+        comment._parent = self
+
+    def _children_changed(self):
+        self._index = None
+
+        # A cached walk includes the cached walks of all the descendants.
+        ds = self
+        while ds is not None and ds._walk is not None:
+            ds._walk = None
+            ds = ds._parent
+
     def add_child(self, comment):
-        self._children.append(comment)
+        self._insert_child(comment)
+        self._children_changed()
 
     def add_children(self, comments):
-        self._children.extend(comments)
+        for comment in comments:
+            self._insert_child(comment)
+
+        self._children_changed()
 
 
 class RootDocstring(_CompoundDocstring):
+    # ParseSession keeps weak references to roots.
+    __slots__ = ('__weakref__', '_clang_args', '_filename')
+
     def __init__(self, filename, domain, clang_args):
         super().__init__(cursor=None, nest=0)
         self._filename = filename
@@ -333,27 +626,33 @@ class RootDocstring(_CompoundDocstring):
 
 
 class StructDocstring(_CompoundDocstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. {domain}:struct:: {name}'
 
 
 class UnionDocstring(_CompoundDocstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. {domain}:union:: {name}'
 
 
 class EnumDocstring(_CompoundDocstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. {domain}:enum:: {name}'
 
 
 class EnumeratorDocstring(Docstring):
+    __slots__ = ('_value_value',)
+
     _indent = 1
     _fmt = '.. {domain}:enumerator:: {name}{value}'
 
-    def __init__(self, cursor, nest):
-        self._value = cursor.value
-        super().__init__(cursor=cursor, nest=nest)
+    _value = _CursorField('value')
 
     def _get_header_lines(self):
         value = f' = {self._value}' if self._value is not None else ''
@@ -363,6 +662,8 @@ class EnumeratorDocstring(Docstring):
 
 
 class MemberDocstring(Docstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. {domain}:member:: {ttype}{type_spacer}{name}'
 
@@ -381,11 +682,15 @@ class MemberDocstring(Docstring):
 
 
 class MacroDocstring(Docstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. c:macro:: {name}'
 
 
 class MacroFunctionDocstring(Docstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. c:macro:: {name}({args})'
 
@@ -399,6 +704,8 @@ class MacroFunctionDocstring(Docstring):
 
 
 class FunctionDocstring(Docstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. {domain}:function:: {ttype}{type_spacer}{name}({args}){quals_spacer}{quals}'
 
@@ -441,10 +748,31 @@ class FunctionDocstring(Docstring):
 
 
 class ClassDocstring(_CompoundDocstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. cpp:class:: {name}'
 
 
 class EnumClassDocstring(_CompoundDocstring):
+    __slots__ = ()
+
     _indent = 1
     _fmt = '.. cpp:enum-class:: {name}'
+
+
+def get_docstrings(docstrings, processor):
+    """Get the docstrings of a number of docstrings, processing them in one batch.
+
+    The comments are processed using ``processor.process_docstrings()``.
+    Return a list of ``(lines, line_number)`` tuples, as returned by
+    :meth:`Docstring.get_docstring`, in order.
+    """
+    comments = [ds._get_comment(processor) for ds in docstrings]
+
+    processor.process_docstrings([comment_lines for comment_lines, _ in comments])
+
+    return [
+        ds._get_docstring(processor, comment_lines, line_offset)
+        for ds, (comment_lines, line_offset) in zip(docstrings, comments)
+    ]
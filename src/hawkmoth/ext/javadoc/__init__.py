@@ -4,9 +4,23 @@
 import re
 from typing import Optional
 
+from hawkmoth.cache import pure_transform
+
 # The "operator" character, either \ or @, but not escaped with \
 OP = r'(?<!\\)(?P<op>[\\@])'
 
+# Inline markup
+_WORD = r'[^\s.]+'
+_TAGGED_PHRASE = r'[^<]*'
+
+_italics_command = re.compile(rf'{OP}(a|e|em)\s+(?P<markup>{_WORD})')
+_italics_tag = re.compile(rf'<em>(?P<markup>{_TAGGED_PHRASE})</em>')
+_bold_command = re.compile(rf'{OP}b\s+(?P<markup>{_WORD})')
+_bold_tag = re.compile(rf'<b>(?P<markup>{_TAGGED_PHRASE})</b>')
+_monospace_command = re.compile(rf'{OP}(c|p)\s+(?P<markup>{_WORD})')
+_monospace_tag = re.compile(rf'<tt>(?P<markup>{_TAGGED_PHRASE})</tt>')
+_ref_command = re.compile(rf'{OP}ref\s+(?P<ref>\w+)')
+
 
 class _handler:
     """Base class for all command handlers."""
@@ -32,24 +46,37 @@ class _handler:
     def _inline_markup(line):
         """Handle inline markup."""
 
-        word_regex = r'[^\s.]+'
-        tagged_phrase_regex = r'[^<]*'
+        # The patterns need an operator or a tag. The substitutions don't add
+        # any new operator or < characters, so check for them only once.
+        has_op = '\\' in line or '@' in line
+        if not has_op and '<' not in line:
+            return line
+
+        # The substitutions must be done in this order, as the later ones may
+        # match the results of the earlier ones.
 
         # italics: \a \e \em <em>...</em>
-        line = re.sub(rf'{OP}(a|e|em)\s+(?P<markup>{word_regex})', r'*\g<markup>*', line)
-        line = re.sub(rf'<em>(?P<markup>{tagged_phrase_regex})</em>', r'*\g<markup>*', line)
+        if has_op:
+            line = _italics_command.sub(r'*\g<markup>*', line)
+        if '<em>' in line:
+            line = _italics_tag.sub(r'*\g<markup>*', line)
 
         # bold: \b <b>...</b>
-        line = re.sub(rf'{OP}b\s+(?P<markup>{word_regex})', r'**\g<markup>**', line)
-        line = re.sub(rf'<b>(?P<markup>{tagged_phrase_regex})</b>', r'**\g<markup>**', line)
+        if has_op:
+            line = _bold_command.sub(r'**\g<markup>**', line)
+        if '<b>' in line:
+            line = _bold_tag.sub(r'**\g<markup>**', line)
 
         # monospace: \c \p <tt>...</tt>
-        line = re.sub(rf'{OP}(c|p)\s+(?P<markup>{word_regex})', r'``\g<markup>``', line)
-        line = re.sub(rf'<tt>(?P<markup>{tagged_phrase_regex})</tt>', r'``\g<markup>``', line)
+        if has_op:
+            line = _monospace_command.sub(r'``\g<markup>``', line)
+        if '<tt>' in line:
+            line = _monospace_tag.sub(r'``\g<markup>``', line)
 
         # references to previous anchors
         # FIXME: link title
-        line = re.sub(rf'{OP}ref\s+(?P<ref>\w+)', r':any:`\g<ref>`', line)
+        if has_op:
+            line = _ref_command.sub(r':any:`\g<ref>`', line)
 
         # FIXME:
         # - copybrief
@@ -411,7 +438,6 @@ _handlers = {
     'xmlonly': _ignore_until_end_command,
 }
 
-# Ensure at least this regex is compiled.
 _command_pattern = re.compile(rf'(?P<indent>\s*){OP}(?P<command>[a-zA-Z]+)(?P<rest>.*)')
 
 
@@ -424,7 +450,8 @@ def _convert(lines, app=None):
             yield from handler.convert(line)
             continue
 
-        mo = _command_pattern.match(line)
+        # Only lines with an operator can have a command.
+        mo = _command_pattern.match(line) if '\\' in line or '@' in line else None
         if mo is None:
             # No command match, continue with current handler
             yield from handler.convert(line)
@@ -449,6 +476,7 @@ def _convert(lines, app=None):
         yield from handler.header()
 
 
+@pure_transform
 def _process_docstring(app, lines, transform, options):
     if transform != app.config.hawkmoth_javadoc_transform:
         return
@@ -456,11 +484,19 @@ def _process_docstring(app, lines, transform, options):
     lines[:] = [line for line in _convert(app=app, lines=lines)]
 
 
+@pure_transform
 def process_docstring(lines):
     """Simple interface for CLI and testing."""
     lines[:] = [line for line in _convert(lines=lines)]
 
 
+@pure_transform
+def process_docstrings(batch):
+    """Simple batch interface for CLI and testing."""
+    for lines in batch:
+        lines[:] = [line for line in _convert(lines=lines)]
+
+
 def setup(app):
     app.setup_extension('hawkmoth')
 
@@ -1,36 +1,84 @@
 # SPDX-FileCopyrightText: 2023 Jani Nikula <jani@nikula.org>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import types
+
 from sphinx.ext import napoleon
 
+from hawkmoth import transform_in_parallel
+from hawkmoth.cache import pure_transform
+
+
+def _get_settings(config):
+    """Get the napoleon settings from the Sphinx configuration."""
+    config_values = napoleon.Config._config_values
+
+    # A dict in older Sphinx versions
+    if isinstance(config_values, dict):
+        names = list(config_values)
+    else:
+        names = [config_value[0] for config_value in config_values]
+
+    return {name: getattr(config, name) for name in names}
+
 
-def _process_docstring_proxy(app, lines, transform, options):
+def _process_docstrings_chunk(chunk, settings, options):
+    # Napoleon only uses the configuration of the Sphinx application object,
+    # which can't be passed to worker processes.
+    app = types.SimpleNamespace(config=napoleon.Config(**settings))
+
+    for lines in chunk:
+        # HACK: The Napoleon _process_docstring() function is for connecting to
+        # the Sphinx autodoc autodoc-process-docstring event. It's ugly to call
+        # it directly, but the alternative is duplicating all it does, which is
+        # also ugly.
+        napoleon._process_docstring(app, None, None, None, options, lines)
+
+    return chunk
+
+
+@pure_transform
+def _process_docstrings_proxy(app, batch, transform, options):
     if transform != app.config.hawkmoth_napoleon_transform:
         return
 
-    # HACK: The Napoleon _process_docstring() function is for connecting to the
-    # Sphinx autodoc autodoc-process-docstring event. It's ugly to call it
-    # directly, but the alternative is duplicating all it does, which is also
-    # ugly.
+    settings = _get_settings(app.config)
 
-    return napoleon._process_docstring(app, None, None, None, options, lines)
+    transform_in_parallel(app, _process_docstrings_chunk, batch, settings, options)
 
 
-def process_docstring(lines):
-    """Simple interface for CLI and testing."""
+def _get_config():
+    return napoleon.Config(napoleon_use_rtype=False)
+
+
+def _convert(lines, config):
     comment = '\n'.join(lines)
-    config = napoleon.Config(napoleon_use_rtype=False)
     comment = str(napoleon.docstring.GoogleDocstring(comment, config))
     lines[:] = comment.splitlines()[:]
 
 
+@pure_transform
+def process_docstring(lines):
+    """Simple interface for CLI and testing."""
+    _convert(lines, _get_config())
+
+
+@pure_transform
+def process_docstrings(batch):
+    """Simple batch interface for CLI and testing."""
+    config = _get_config()
+
+    for lines in batch:
+        _convert(lines, config)
+
+
 def setup(app):
     app.setup_extension('sphinx.ext.napoleon')
     app.setup_extension('hawkmoth')
 
     app.add_config_value('hawkmoth_napoleon_transform', 'napoleon', 'env', [str])
 
-    app.connect('hawkmoth-process-docstring', _process_docstring_proxy)
+    app.connect('hawkmoth-process-docstrings', _process_docstrings_proxy)
 
     return {
         'parallel_read_safe': True,
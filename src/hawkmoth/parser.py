@@ -30,15 +30,25 @@ There is minimal syntax parsing or input conversion:
 The documentation comments are returned verbatim in a tree of Docstring objects.
 """
 
+import collections
 import enum
+import functools
+import mmap
 import os
+import re
+import weakref
+from ctypes import c_int
 from dataclasses import dataclass
 
 from clang.cindex import (
     Diagnostic,
     Index,
+    SourceLocation,
     TranslationUnit,
     TranslationUnitLoadError,
+    TranslationUnitSaveError,
+    _CXString,
+    callbacks,
     conf,
 )
 
@@ -46,8 +56,11 @@ from hawkmoth import docstring
 from hawkmoth.doccursor import (
     CursorKind,
     DocCursor,
+    FileTokens,
     TokenKind,
 )
+from hawkmoth.util.fileutil import file_stamp, stamps_are_valid
+from hawkmoth.util.timing import NullTimings
 
 
 class ErrorLevel(enum.IntEnum):
@@ -81,15 +94,22 @@ class ParserError:
             return f'{self.message}'
 
 
-def _domain_is_valid(tu, domain, errors):
-    """Check the derived domain of a translation unit against the expected one.
+def _get_inferred_domain(tu):
+    """Infer the domain of a translation unit from the predefined macros.
+
+    The predefined macros, including the ones from the command-line, are the
+    first cursors in the translation unit, and they don't have a file. Only look
+    at them, and stop at the first cursor with a file, instead of walking all
+    the cursors, including all the macro definitions from all the included
+    headers.
 
     The derived domain is observed indirectly by the definition of certain C++
     specific macros. We try to maximize our chances by looking for any of the
     known macros in case any of them is disabled through compiler flags or
     preprocessor statements.
     """
-    cpp_macros = (
+    cpp_macros = {
+        '__cplusplus',
         '__cpp_rtti',
         '__cpp_exceptions',
         '__cpp_unicode_characters',
@@ -121,42 +141,54 @@ def _domain_is_valid(tu, domain, errors):
         '__cpp_aggregate_nsdmi',
         '__cpp_variable_templates',
         '__cpp_impl_destroying_delete',
-    )
+    }
+
+    inferred_domain = 'c'
+
+    # Cursor.get_children() visits all the children before returning any, so
+    # visit the children directly to be able to stop early.
+    def visitor(cursor, parent, data):
+        nonlocal inferred_domain
+
+        if cursor.location.file is not None:
+            return 0  # CXChildVisit_Break
+
+        if cursor.kind == CursorKind.MACRO_DEFINITION and cursor.spelling in cpp_macros:
+            inferred_domain = 'cpp'
+            return 0  # CXChildVisit_Break
 
+        return 1  # CXChildVisit_Continue
+
+    conf.lib.clang_visitChildren(tu.cursor, callbacks['cursor_visit'](visitor), None)
+
+    return inferred_domain
+
+
+def _domain_is_valid(tu, domain, errors):
+    """Check the derived domain of a translation unit against the expected one."""
     if domain not in ['c', 'cpp']:
         errors.append(
             ParserError(ErrorLevel.CRITICAL, None, None, f"domain '{domain}' not in ['c', 'cpp']")
         )
         return False
 
-    for cursor in tu.cursor.get_children():
-        if cursor.kind == CursorKind.MACRO_DEFINITION and cursor.spelling in cpp_macros:
-            if domain != 'cpp':
-                errors.append(
-                    ParserError(
-                        ErrorLevel.CRITICAL,
-                        None,
-                        None,
-                        f'domain ({domain}) does not match inferred domain (cpp)',
-                    )
-                )
-                return False
-            return True
+    inferred_domain = _get_inferred_domain(tu)
 
-    if domain != 'c':
+    if domain != inferred_domain:
         errors.append(
             ParserError(
                 ErrorLevel.CRITICAL,
                 None,
                 None,
-                f'domain ({domain}) does not match inferred domain (c)',
+                f'domain ({domain}) does not match inferred domain ({inferred_domain})',
             )
         )
         return False
+
     return True
 
 
-def _comment_extract(tu):
+def _comment_extract(tokens):
     # FIXME: How to handle top level comments above a cursor that it does *not*
     # describe? Parsing @file or @doc at this stage would not be a clean design.
     # One idea is to use '/***' to denote them, but that might throw off editor
@@ -165,10 +197,12 @@ def _comment_extract(tu):
 
     top_level_comments = []
     comments = {}
+    # The pending documentation comment, if any. Non-documentation comments are
+    # never pending, as they have no effect on the result.
     current_comment = None
 
-    def is_doc(cursor):
-        return cursor and docstring.Docstring.is_doc(cursor.spelling)
+    def is_doc(token):
+        return docstring.Docstring.is_doc(token.spelling)
 
     # Check for null cursors. Clang 21's cindex.py should be replacing all
     # returned null cursors with None. However, due to a bug (as of 21.1.3) it
@@ -176,16 +210,23 @@ def _comment_extract(tu):
     #
     # We need to explicitly check for these because cindex.py 21 also raises an
     # exception when any property of a null cursor is accessed.
+    null_cursor = conf.lib.clang_getNullCursor()
+
     def is_null(cursor):
-        return cursor is None or cursor == conf.lib.clang_getNullCursor()
+        return cursor is None or cursor == null_cursor
 
-    for token in tu.get_tokens(extent=tu.cursor.extent):
+    for token in tokens:
         # Handle all comments we come across.
         if token.kind == TokenKind.COMMENT:
             # If we already have a comment, it wasn't related to another cursor.
-            if is_doc(current_comment):
+            if current_comment is not None:
                 top_level_comments.append(current_comment)
-            current_comment = token
+            current_comment = token if is_doc(token) else None
+            continue
+
+        # Without a pending comment, the token's cursor doesn't matter. Skip the
+        # expensive cursor lookup for the vast majority of the tokens.
+        if current_comment is None:
             continue
 
         # Store off the token's cursor for a slight performance improvement
@@ -209,19 +250,17 @@ def _comment_extract(tu):
         # Cursors that are 1) never documented themselves, and 2) not allowed
         # between the comment and the actual cursor being documented.
         if token_cursor.kind in [CursorKind.LINKAGE_SPEC, CursorKind.UNEXPOSED_DECL]:
-            if is_doc(current_comment):
-                top_level_comments.append(current_comment)
+            top_level_comments.append(current_comment)
             current_comment = None
             continue
 
         # Otherwise the current comment documents _this_ cursor. I.e.: not a top
         # level comment.
-        if is_doc(current_comment):
-            comments[token_cursor.hash] = current_comment
+        comments[token_cursor.hash] = current_comment
         current_comment = None
 
     # Comment at the end of file.
-    if is_doc(current_comment):
+    if current_comment is not None:
         top_level_comments.append(current_comment)
 
     return top_level_comments, comments
@@ -388,56 +427,364 @@ def _language_option(filename, domain):
     return language
 
 
-# Parse a file and return a tree of docstring.Docstring objects.
-def parse(filename, domain=None, clang_args=None):
-    # Empty root comment with just children
-    result = docstring.RootDocstring(filename=filename, domain=domain, clang_args=clang_args)
+@functools.lru_cache(maxsize=None)
+def get_libclang_version():
+    """Return the libclang version string, e.g. 'clang version 18.1.1'."""
+    # The Python bindings don't register this function, so set the prototype
+    # here.
+    fn = conf.lib.clang_getClangVersion
+    fn.argtypes = []
+    fn.restype = _CXString
+
+    return _CXString.from_result(fn())
+
+
+def _get_dependencies(tu):
+    """Return the names of the files a translation unit depends on."""
+    return [inclusion.include.name for inclusion in tu.get_includes()]
+
+
+def build_pch(header, domain, clang_args, output):
+    """Build a precompiled header from header to the output file.
+
+    Return a list of errors and a list of the files the precompiled header
+    depends on.
+    """
     errors = []
     index = Index.create()
 
-    # Note: Preserve the passed in clang_args in RootDocstring, as it's used for
-    # filtering by the callers
-    full_args = [_language_option(filename, domain)]
+    full_args = ['-xc++-header' if domain == 'cpp' else '-xc-header']
     if clang_args:
         full_args.extend(clang_args)
 
     try:
         tu = index.parse(
-            filename,
+            header,
             args=full_args,
-            options=TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
+            options=TranslationUnit.PARSE_INCOMPLETE
+            | TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
             | TranslationUnit.PARSE_SKIP_FUNCTION_BODIES,
         )
     except TranslationUnitLoadError as e:
-        # File not found is a common problem, but not properly reported by
-        # clang. Try to be a bit more helpful.
-        if not os.path.isfile(filename):
-            message = f'File not found. {str(e)}'
-        else:
-            message = str(e)
+        errors.append(ParserError(ErrorLevel.CRITICAL, header, None, str(e)))
+        return errors, []
 
-        errors.append(ParserError(ErrorLevel.CRITICAL, filename, None, message))
+    _clang_diagnostics(tu.diagnostics, errors)
 
-        return result, errors
+    if any(error.level >= ErrorLevel.ERROR for error in errors):
+        return errors, []
 
-    _clang_diagnostics(tu.diagnostics, errors)
+    try:
+        tu.save(output)
+    except TranslationUnitSaveError as e:
+        errors.append(ParserError(ErrorLevel.CRITICAL, header, None, str(e)))
+        return errors, []
+
+    return errors, [header] + _get_dependencies(tu)
 
-    if not _domain_is_valid(tu, domain, errors):
-        return result, errors
 
-    top_level_comments, comments = _comment_extract(tu)
+# Comments, and string and character literals that may contain comment markers.
+# Unterminated comments extend to the end of the file, and unterminated literals
+# don't match at all, in the spirit of never missing a documentation comment.
+_comment_or_literal_pattern = re.compile(
+    rb'/\*.*?(?:\*/|\Z)|//[^\n]*|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.DOTALL
+)
+
+# Memory map files larger than this for the lexical scan
+_MMAP_THRESHOLD = 1024 * 1024
+
+
+def _has_doc_comments(filename):
+    """Check if a file may contain documentation comments, without libclang.
 
-    for comment in top_level_comments:
-        text = comment.spelling
-        meta = {'line': comment.extent.start.line}
-        ds = docstring.TextDocstring(text=text, meta=meta)
-        result.add_child(ds)
+    This is a quick lexical scan, ignoring comment markers in string and
+    character literals. Conditional compilation is not taken into account, so
+    this may give false positives, but never false negatives.
+    """
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return False
 
-    for cc in tu.cursor.get_children():
-        cursor = DocCursor(domain=domain, cursor=cc, comments=comments)
-        if cursor.comment:
-            result.add_children(_recursive_parse(errors, cursor, 0))
+        if size >= _MMAP_THRESHOLD:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
         else:
-            result.add_children(_parse_undocumented_block(errors, cursor, 0))
+            data = f.read()
+
+    try:
+        for mo in _comment_or_literal_pattern.finditer(data):
+            comment = mo.group()
+            if comment.startswith(b'/**') and docstring.Docstring.is_doc(comment.decode('latin-1')):
+                return True
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+    return False
+
+
+def _get_main_file_cursors(tu):
+    """Return the top-level cursors of a translation unit in the main file.
+
+    The comments are only extracted from the main file, so the cursors from the
+    included files, and the predefined macros, are never documented. Filter
+    them out in one pass, before wrapping any of them in DocCursor.
+    """
+    # The Python bindings don't register this function, so set the prototype
+    # here.
+    is_from_main_file = conf.lib.clang_Location_isFromMainFile
+    is_from_main_file.argtypes = [SourceLocation]
+    is_from_main_file.restype = c_int
+
+    get_cursor_location = conf.lib.clang_getCursorLocation
+
+    cursors = []
+
+    def visitor(cursor, parent, data):
+        if is_from_main_file(get_cursor_location(cursor)):
+            cursor._tu = tu
+            cursors.append(cursor)
+
+        return 1  # CXChildVisit_Continue
+
+    conf.lib.clang_visitChildren(tu.cursor, callbacks['cursor_visit'](visitor), None)
+
+    return cursors
+
+
+def _parse_translation_unit(tu, filename, domain, clang_args, timings):
+    # Empty root comment with just children
+    result = docstring.RootDocstring(filename=filename, domain=domain, clang_args=clang_args)
+    errors = []
+
+    with timings.phase('diagnostics'):
+        diagnostics = tu.diagnostics
+        timings.count('diagnostics', len(diagnostics))
+
+        _clang_diagnostics(diagnostics, errors)
+
+        if not _domain_is_valid(tu, domain, errors):
+            return result, errors
+
+    with timings.phase('comments'):
+        # Tokenize the main file once, for both comment extraction and the
+        # tokens of the cursors.
+        file_tokens = FileTokens(tu, tu.cursor.extent)
+        timings.count('tokens', len(file_tokens))
+
+        top_level_comments, comments = _comment_extract(file_tokens)
+
+        for comment in top_level_comments:
+            text = comment.spelling
+            meta = {'line': comment.extent.start.line}
+            ds = docstring.TextDocstring(text=text, meta=meta)
+            result.add_child(ds)
+
+    with timings.phase('cursors'):
+        namespaces = {}
+
+        main_file_cursors = _get_main_file_cursors(tu)
+        timings.count('cursors', len(main_file_cursors))
+
+        for cc in main_file_cursors:
+            cursor = DocCursor(
+                domain=domain,
+                cursor=cc,
+                comments=comments,
+                tokens=file_tokens,
+                namespaces=namespaces,
+            )
+            if cursor.comment:
+                result.add_children(_recursive_parse(errors, cursor, 0))
+            else:
+                result.add_children(_parse_undocumented_block(errors, cursor, 0))
 
     return result, errors
+
+
+# For not measuring anything when timings aren't requested
+_no_timings = NullTimings()
+
+
+def _materialize(roots):
+    for root in list(roots):
+        root.materialize()
+
+    roots.clear()
+
+
+class ParseSession:
+    """Parsing context for parsing many files, or the same files repeatedly.
+
+    The session owns a single clang index, and keeps the most recently used
+    translation units around. When a file is parsed again with the same domain
+    and clang args, the translation unit is reused as-is if neither the file nor
+    any of the files it includes have changed, and reparsed otherwise. The
+    translation units are parsed with precompiled preambles, so that reparsing
+    a file with an unchanged prefix of includes is cheap.
+
+    The docstring fields are evaluated lazily from the translation unit. The
+    session materializes the results (see :meth:`Docstring.materialize()
+    <hawkmoth.docstring.Docstring.materialize>`) before reparsing or
+    releasing the translation unit they were parsed from.
+
+    Args:
+        max_translation_units (int): The maximum number of translation units
+            to keep around. Zero to not keep any.
+    """
+
+    def __init__(self, max_translation_units=16):
+        # Created on demand, not needed for cached results
+        self._index = None
+        self._max_translation_units = max_translation_units
+        # key -> (tu, stamps, roots) in least recently used first order, where
+        # roots are the lazily evaluated results parsed from the tu
+        self._translation_units = collections.OrderedDict()
+
+    def _options(self):
+        options = (
+            TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
+            | TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+        )
+
+        # Precompiled preambles only pay off when reparsing.
+        if self._max_translation_units > 0:
+            options |= TranslationUnit.PARSE_PRECOMPILED_PREAMBLE
+
+        return options
+
+    @staticmethod
+    def _get_stamps(filename, tu):
+        dependencies = [filename] + _get_dependencies(tu)
+
+        try:
+            return [(dependency, file_stamp(dependency)) for dependency in dependencies]
+        except OSError:
+            return None
+
+    def _get_translation_unit(self, filename, args, timings):
+        key = (filename, tuple(args))
+
+        tu = None
+        roots = weakref.WeakSet()
+        entry = self._translation_units.pop(key, None)
+        if entry is not None:
+            tu, stamps, roots = entry
+            if not stamps or not stamps_are_valid(stamps):
+                # Reparsing invalidates the cursors of the previous results.
+                _materialize(roots)
+                try:
+                    with timings.phase('parse'):
+                        tu.reparse()
+                except TranslationUnitLoadError:
+                    tu = None
+
+        if tu is None:
+            if self._index is None:
+                self._index = Index.create()
+
+            with timings.phase('parse'):
+                tu = self._index.parse(filename, args=args, options=self._options())
+
+        if self._max_translation_units > 0:
+            self._translation_units[key] = (tu, self._get_stamps(filename, tu), roots)
+
+            while len(self._translation_units) > self._max_translation_units:
+                _, (_, _, evicted_roots) = self._translation_units.popitem(last=False)
+                _materialize(evicted_roots)
+
+        return tu, roots
+
+    def clear(self):
+        """Release all the translation units kept around."""
+        for _, _, roots in self._translation_units.values():
+            _materialize(roots)
+
+        self._translation_units.clear()
+
+    def parse(self, filename, domain=None, clang_args=None, cache=None, timings=None):
+        """Parse a file and return a tree of docstring.Docstring objects.
+
+        See :func:`parse`.
+        """
+        if timings is None:
+            timings = _no_timings
+
+        if cache is not None:
+            with timings.phase('cache'):
+                cached = cache.get(filename, domain, clang_args)
+
+            if cached is not None:
+                timings.count('cache.hits')
+                return cached
+
+            timings.count('cache.misses')
+
+        # Files without documentation comments have nothing to extract. Leave it
+        # to libclang to report errors in accessing the file.
+        try:
+            with timings.phase('scan'):
+                has_doc_comments = _has_doc_comments(filename)
+
+            if not has_doc_comments:
+                result = docstring.RootDocstring(
+                    filename=filename, domain=domain, clang_args=clang_args
+                )
+                return result, []
+        except OSError:
+            pass
+
+        # Note: Preserve the passed in clang_args in RootDocstring, as it's used
+        # for filtering by the callers
+        full_args = [_language_option(filename, domain)]
+        if clang_args:
+            full_args.extend(clang_args)
+
+        try:
+            tu, roots = self._get_translation_unit(filename, full_args, timings)
+        except TranslationUnitLoadError as e:
+            # File not found is a common problem, but not properly reported by
+            # clang. Try to be a bit more helpful.
+            if not os.path.isfile(filename):
+                message = f'File not found. {str(e)}'
+            else:
+                message = str(e)
+
+            result = docstring.RootDocstring(
+                filename=filename, domain=domain, clang_args=clang_args
+            )
+            errors = [ParserError(ErrorLevel.CRITICAL, filename, None, message)]
+
+            # Don't cache failures to load the file at all.
+            return result, errors
+
+        result, errors = _parse_translation_unit(tu, filename, domain, clang_args, timings)
+        roots.add(result)
+
+        if cache is not None:
+            with timings.phase('cache'):
+                cache.put(filename, domain, clang_args, (result, errors), _get_dependencies(tu))
+
+        return result, errors
+
+
+def parse(filename, domain=None, clang_args=None, cache=None, timings=None):
+    """Parse a file and return a tree of docstring.Docstring objects.
+
+    If cache (see :class:`hawkmoth.cache.ParseCache`) is given, look up the
+    result there first, and store the result there after parsing.
+
+    If timings (see :class:`hawkmoth.util.timing.Timings`) is given, record the
+    time spent in each phase of parsing there.
+
+    Use :class:`ParseSession` for parsing many files, or the same files
+    repeatedly.
+
+    The docstring fields are evaluated lazily, and the result keeps the
+    translation unit alive until it's materialized.
+    """
+    session = ParseSession(max_translation_units=0)
+
+    return session.parse(
+        filename, domain=domain, clang_args=clang_args, cache=cache, timings=timings
+    )
@@ -0,0 +1,185 @@
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Symbol database
+===============
+
+This module provides an offline database for the results of
+:func:`hawkmoth.parser.parse`, for parsing the source files in a separate step
+before the Sphinx build. This module does not depend on Sphinx.
+
+:func:`write` writes the parse results of any number of files to a database
+file. :class:`SymbolDatabase` memory maps the database file, and only decodes
+the documentation comments that are actually looked up.
+
+The database file consists of:
+
+* A fixed size header with the file format version, and the location of the
+  index in the file.
+
+* The top-level documentation comments of each file, along with their
+  children, pickled separately.
+
+* The index, pickled. For each file name and domain, the index has the clang
+  arguments and the errors of the parse, and the name, type, and location in the
+  file of each top-level documentation comment.
+
+The file names are stored relative to a root directory, so that the database
+may be used in another location.
+"""
+
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+
+from hawkmoth.docstring import RootDocstring
+
+_MAGIC = b'HAWKMOTH'
+
+# Bump this whenever the file format or the pickled classes change in an
+# incompatible way.
+_FORMAT = 1
+
+# Magic, format, index offset, index size
+_HEADER = struct.Struct('<8sIQQ')
+
+
+def _key(filename, domain, root):
+    return (os.path.normpath(os.path.relpath(filename, root)), domain)
+
+
+def write(path, results, root='.'):
+    """Write parse results to a symbol database file.
+
+    The file is replaced atomically.
+
+    Args:
+        path (str): The database file name.
+        results: Iterable of ``(RootDocstring, errors)`` results from
+            :func:`hawkmoth.parser.parse`.
+        root (str): The directory to store the file names relative to.
+    """
+    files = {}
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            # Placeholder until the location of the index is known
+            f.write(_HEADER.pack(_MAGIC, _FORMAT, 0, 0))
+
+            for docstrings, errors in results:
+                entries = []
+                for ds in docstrings:
+                    data = pickle.dumps(ds, protocol=pickle.HIGHEST_PROTOCOL)
+                    entries.append((ds.get_name(), type(ds), f.tell(), len(data)))
+                    f.write(data)
+
+                key = _key(docstrings.get_filename(), docstrings.get_domain(), root)
+                files[key] = (docstrings.get_clang_args(), errors, entries)
+
+            index = pickle.dumps(files, protocol=pickle.HIGHEST_PROTOCOL)
+            index_offset = f.tell()
+            f.write(index)
+
+            f.seek(0)
+            f.write(_HEADER.pack(_MAGIC, _FORMAT, index_offset, len(index)))
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class _DatabaseRootDocstring(RootDocstring):
+    """Root docstring decoding its children from the database on demand."""
+
+    __slots__ = ('_database', '_entries')
+
+    def __init__(self, filename, domain, clang_args, database, entries):
+        super().__init__(filename=filename, domain=domain, clang_args=clang_args)
+        self._database = database
+        self._entries = entries
+        # None for not decoded yet
+        self._children = [None] * len(entries)
+
+    def _get_child(self, position):
+        child = self._children[position]
+        if child is None:
+            _, _, offset, size = self._entries[position]
+            child = self._database._decode(offset, size)
+            child._parent = self
+            self._children[position] = child
+
+        return child
+
+    def __iter__(self):
+        for position in range(len(self._entries)):
+            yield self._get_child(position)
+
+    def find(self, names, types=None):
+        names = set(names)
+        for position, (name, cls, _, _) in enumerate(self._entries):
+            if name in names and (types is None or cls in types):
+                yield self._get_child(position)
+
+    def materialize(self):
+        # The decoded docstrings don't have cursors.
+        pass
+
+
+class SymbolDatabase:
+    """Memory mapped symbol database.
+
+    Raises OSError if the file can't be read, and ValueError if it's not a
+    symbol database of a supported format.
+
+    Args:
+        path (str): The database file name.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                raise ValueError(f'{path}: not a symbol database')
+
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, file_format, index_offset, index_size = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC:
+            raise ValueError(f'{path}: not a symbol database')
+
+        if file_format != _FORMAT:
+            raise ValueError(f'{path}: unsupported symbol database format {file_format}')
+
+        try:
+            self._files = self._decode(index_offset, index_size)
+        except (EOFError, pickle.UnpicklingError) as e:
+            raise ValueError(f'{path}: corrupted symbol database') from e
+
+    def _decode(self, offset, size):
+        return pickle.loads(self._mmap[offset : offset + size])
+
+    def get(self, filename, domain, root='.', clang_args=None):
+        """Get a ``(RootDocstring, errors)`` result, or None if not found.
+
+        The documentation comments are decoded from the database on demand.
+
+        Args:
+            filename (str): The file name to look up, relative to root.
+            domain (str): The domain to look up.
+            root (str): The directory the file names are relative to.
+            clang_args (list): The clang arguments for the returned
+                ``RootDocstring``, regardless of the clang arguments the file
+                was parsed with. If None, use the latter.
+        """
+        entry = self._files.get(_key(filename, domain, root))
+        if entry is None:
+            return None
+
+        parse_clang_args, errors, entries = entry
+        if clang_args is None:
+            clang_args = parse_clang_args
+
+        return _DatabaseRootDocstring(filename, domain, clang_args, self, entries), errors
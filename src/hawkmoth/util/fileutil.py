@@ -0,0 +1,22 @@
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+
+
+def file_stamp(filename):
+    """Return a stamp for detecting changes to a file.
+
+    Raises OSError if the file can't be accessed.
+    """
+    st = os.stat(filename)
+
+    return (st.st_mtime_ns, st.st_size)
+
+
+def stamps_are_valid(stamps):
+    """Check if none of the files in a list of (filename, stamp) have changed."""
+    try:
+        return all(file_stamp(filename) == stamp for filename, stamp in stamps)
+    except OSError:
+        return False
@@ -0,0 +1,132 @@
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Timings
+=======
+
+Wall and CPU time per phase, counters, and peak memory usage, for finding out
+where the time goes.
+"""
+
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def get_peak_rss():
+    """Return the peak resident set size of the process in bytes, or None."""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Timings:
+    """Accumulate wall and CPU time per phase, and counters.
+
+    Nested phases are exclusive, i.e. the time spent in a nested phase is not
+    included in the enclosing phase.
+    """
+
+    def __init__(self):
+        # name -> [wall, cpu] in order of first use
+        self.phases = {}
+        self.counters = {}
+        self.peak_rss = None
+        # [wall, cpu] of the nested phases of the active phases
+        self._stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        nested = [0.0, 0.0]
+        self._stack.append(nested)
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += wall
+                self._stack[-1][1] += cpu
+
+            totals = self.phases.setdefault(name, [0.0, 0.0])
+            totals[0] += wall - nested[0]
+            totals[1] += cpu - nested[1]
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def update_peak_rss(self):
+        peak = get_peak_rss()
+        if peak is not None:
+            self.peak_rss = max(self.peak_rss or 0, peak)
+
+    def merge(self, other):
+        """Add the times and counters of other, e.g. from another process."""
+        for name, (wall, cpu) in other.phases.items():
+            totals = self.phases.setdefault(name, [0.0, 0.0])
+            totals[0] += wall
+            totals[1] += cpu
+
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+        if other.peak_rss is not None:
+            self.peak_rss = max(self.peak_rss or 0, other.peak_rss)
+
+    def to_dict(self):
+        return {
+            'phases': {
+                name: {'wall': wall, 'cpu': cpu} for name, (wall, cpu) in self.phases.items()
+            },
+            'counters': dict(self.counters),
+            'peak_rss': self.peak_rss,
+        }
+
+    def format(self):
+        """Return a human readable report as a list of lines."""
+        width = max(len(name) for name in ['total', *self.phases, *self.counters])
+
+        lines = [f'{"phase":{width}}  {"wall (s)":>10}  {"cpu (s)":>10}']
+        for name, (wall, cpu) in self.phases.items():
+            lines.append(f'{name:{width}}  {wall:10.3f}  {cpu:10.3f}')
+
+        if self.phases:
+            wall = sum(wall for wall, _ in self.phases.values())
+            cpu = sum(cpu for _, cpu in self.phases.values())
+            lines.append(f'{"total":{width}}  {wall:10.3f}  {cpu:10.3f}')
+
+        lines.append('')
+        for name, n in self.counters.items():
+            lines.append(f'{name:{width}}  {n:10}')
+
+        if self.peak_rss is not None:
+            lines.append(f'peak RSS: {self.peak_rss / (1024 * 1024):.1f} MiB')
+
+        return lines
+
+
+class NullTimings(Timings):
+    """Timings that don't measure anything, for when timings aren't needed."""
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def count(self, name, n=1):
+        pass
+
+    def update_peak_rss(self):
+        pass
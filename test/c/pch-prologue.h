@@ -0,0 +1,4 @@
+#include <stddef.h>
+#include <stdint.h>
+
+typedef uint32_t prologue_type;
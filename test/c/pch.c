@@ -0,0 +1,9 @@
+/*
+ * The precompiled header is included implicitly, there's no need to include
+ * the prologue here.
+ */
+
+/**
+ * Function using types from the prologue.
+ */
+prologue_type pch_function(size_t size);
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+
+import pytest
+
+from hawkmoth import docstring, parser
+from hawkmoth.cache import MemoryCache, ParseCache, PchCache, TransformCache, pure_transform
+
+
+def _get_output(root):
+    processor = docstring.DocstringProcessor()
+
+    return [ds.get_docstring(processor=processor) for ds in root.walk()]
+
+
+def _write_file(filename, contents):
+    with open(filename, 'w') as f:
+        f.write(contents)
+
+
+@pytest.fixture
+def source(tmp_path):
+    header = tmp_path / 'header.h'
+    _write_file(header, '/** The answer. */\n#define ANSWER 42\n')
+
+    source = tmp_path / 'source.c'
+    _write_file(
+        source,
+        '#include "header.h"\n\n/** Function. */\nint function(int foo);\n',
+    )
+
+    return str(source)
+
+
+def _no_libclang(monkeypatch):
+    def index_create():
+        raise AssertionError('libclang used on cache hit')
+
+    monkeypatch.setattr(parser.Index, 'create', index_create)
+
+
+def test_cache_hit(tmp_path, source, monkeypatch):
+    cache = ParseCache(str(tmp_path / 'cache'))
+
+    root, errors = parser.parse(source, domain='c', cache=cache)
+
+    _no_libclang(monkeypatch)
+
+    cached_root, cached_errors = parser.parse(source, domain='c', cache=cache)
+
+    assert _get_output(cached_root) == _get_output(root)
+    assert cached_errors == errors
+    assert cached_root.get_filename() == root.get_filename()
+
+
+def test_cache_miss_on_changes(tmp_path, source):
+    cache = ParseCache(str(tmp_path / 'cache'))
+
+    parser.parse(source, domain='c', cache=cache)
+
+    assert cache.get(source, 'c', None) is not None
+    assert cache.get(source, 'c', ['-DFOO']) is None
+    assert cache.get(source, 'cpp', None) is None
+
+    # Change an included file.
+    header = os.path.join(os.path.dirname(source), 'header.h')
+    _write_file(header, '/** The question. */\n#define QUESTION 6 * 9\n')
+
+    assert cache.get(source, 'c', None) is None
+
+
+def test_cache_eviction(tmp_path, source):
+    cache = ParseCache(str(tmp_path / 'cache'), max_size=0)
+
+    parser.parse(source, domain='c', cache=cache)
+
+    assert cache.get(source, 'c', None) is None
+
+
+def test_memory_cache(source):
+    cache = MemoryCache()
+
+    result = parser.parse(source, domain='c')
+    cache.put(source, 'c', None, result)
+
+    assert cache.get(source, 'c', None) is result
+    assert cache.get(source, 'c', ['-DFOO']) is None
+    assert cache.get(source, 'cpp', None) is None
+
+    # Change the parsed file.
+    _write_file(source, '/** Function. */\nint function(int foo, int bar);\n')
+
+    assert cache.get(source, 'c', None) is None
+
+
+def test_memory_cache_eviction(source):
+    cache = MemoryCache()
+
+    result = parser.parse(source, domain='c')
+    cache.put(source, 'c', None, result)
+    cache.put(source, 'c', ['-DFOO'], result)
+
+    cache.set_max_size(1)
+
+    assert cache.get(source, 'c', None) is None
+    assert cache.get(source, 'c', ['-DFOO']) is None
+
+
+@pure_transform
+def _upper(lines):
+    lines[:] = [line.upper() for line in lines]
+
+
+def test_transform_cache():
+    cache = TransformCache()
+
+    calls = []
+
+    def fn(lines):
+        calls.append(list(lines))
+        _upper(lines)
+
+    for _ in range(2):
+        lines = ['foo', 'bar']
+        cache.process(fn, lines, 'upper')
+        assert lines == ['FOO', 'BAR']
+
+    assert calls == [['foo', 'bar']]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # The transform, the config, and the number of lines are part of the key.
+    assert not cache.process(fn, ['foo', 'bar'], 'lower')
+    assert not cache.process(fn, ['foo', 'bar'], 'upper', config=('option', 'value'))
+    assert not cache.process(fn, ['foo', 'bar', ''], 'upper')
+    assert cache.process(fn, ['foo', 'bar'], 'upper')
+
+
+def test_transform_cache_batch():
+    cache = TransformCache()
+
+    batches = []
+
+    def fn(batch):
+        batches.append([list(lines) for lines in batch])
+        for lines in batch:
+            _upper(lines)
+
+    cache.process(_upper, ['foo'], 'upper')
+
+    # Only the lines not in the cache are transformed, and identical lines once.
+    batch = [['foo'], ['bar'], ['baz'], ['bar']]
+
+    assert cache.process_batch(fn, batch, 'upper') == 2
+    assert batch == [['FOO'], ['BAR'], ['BAZ'], ['BAR']]
+    assert batches == [[['bar'], ['baz']]]
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_transform_cache_eviction():
+    cache = TransformCache(max_size=1)
+
+    assert not cache.process(_upper, ['foo'], 'upper')
+    assert not cache.process(_upper, ['bar'], 'upper')
+    assert not cache.process(_upper, ['foo'], 'upper')
+
+    cache.set_max_size(0)
+
+    assert not cache.process(_upper, ['foo'], 'upper')
+    assert (cache.hits, cache.misses) == (0, 3)
+
+
+def test_pch_cache(tmp_path):
+    header = tmp_path / 'prologue.h'
+    _write_file(header, '#include "types.h"\n')
+    _write_file(tmp_path / 'types.h', 'typedef int prologue_type;\n')
+
+    cache = PchCache(str(tmp_path / 'cache'))
+
+    args, errors = cache.get_args(str(header), 'c', None)
+
+    assert not errors
+    assert args[0] == '-include-pch'
+    assert os.path.isfile(args[1])
+
+    source = tmp_path / 'source.c'
+    _write_file(source, '/** Variable. */\nprologue_type variable;\n')
+
+    root, errors = parser.parse(str(source), domain='c', clang_args=args)
+
+    assert not errors
+    assert [ds.get_name() for ds in root.walk()] == ['variable']
+
+    # Unchanged inputs reuse the precompiled header.
+    assert cache.get_args(str(header), 'c', None) == (args, [])
+
+    # Changes in included files rebuild the precompiled header.
+    _write_file(tmp_path / 'types.h', 'typedef long prologue_type;\n')
+
+    new_args, errors = cache.get_args(str(header), 'c', None)
+
+    assert not errors
+    assert new_args != args
+    assert os.path.isfile(new_args[1])
+    assert not os.path.exists(args[1])
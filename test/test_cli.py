@@ -3,12 +3,15 @@
 # SPDX-FileCopyrightText: 2022 Bruno Santos <brunomanuelsantos@tecnico.ulisboa.pt>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import json
 import os
 import re
 
 import pytest
 
+from hawkmoth import __main__
 from hawkmoth.__main__ import main
+from hawkmoth.cache import TransformCache
 from test import testenv
 
 
@@ -107,3 +110,100 @@ def test_cli(testcase, monkeypatch, capsys):
     testcase.set_monkeypatch(monkeypatch)
     testcase.set_capsys(capsys)
     testcase.run_test()
+
+
+def _run(monkeypatch, capsys, args):
+    monkeypatch.setattr('sys.argv', ['hawkmoth'] + args)
+    main()
+
+    return capsys.readouterr()
+
+
+def test_cli_batch(tmp_path, monkeypatch, capsys):
+    files = []
+    for name in ['a', 'b', 'c']:
+        source = tmp_path / f'{name}.c'
+        source.write_text(f'/** Function {name}. */\nvoid {name}(unknown_{name} x);\n')
+        files.append(str(source))
+
+    expected_out, expected_err = '', ''
+    for file in files:
+        captured = _run(monkeypatch, capsys, [file])
+        expected_out += captured.out
+        expected_err += captured.err
+
+    filelist = tmp_path / 'filelist'
+    filelist.write_text('\n'.join(files[1:]) + '\n')
+
+    for args in [
+        files,
+        [str(tmp_path / '*.c'), '--jobs=2'],
+        [files[0], f'@{filelist}', '-j', '0'],
+    ]:
+        captured = _run(monkeypatch, capsys, args)
+
+        assert captured.out == expected_out
+        assert captured.err == expected_err
+
+
+def test_cli_error_summary(tmp_path, monkeypatch, capsys):
+    good = tmp_path / 'good.c'
+    good.write_text('/** Good. */\nint good;\n')
+
+    bad = tmp_path / 'bad.c'
+    bad.write_text('/** Bad. */\nunknown_type bad;\n')
+
+    captured = _run(monkeypatch, capsys, [str(good), str(bad), '--error-summary'])
+
+    summary = json.loads(captured.err[captured.err.index('{') :])
+
+    assert [f['file'] for f in summary['files']] == [str(good), str(bad)]
+    assert summary['files'][0]['errors'] == []
+
+    [error] = summary['files'][1]['errors']
+    assert error['level'] == 'ERROR'
+    assert error['filename'] == str(bad)
+    assert error['line'] == 2
+    assert 'unknown_type' in error['message']
+
+
+def test_cli_timings(tmp_path, monkeypatch, capsys):
+    source = tmp_path / 'source.c'
+    source.write_text('/** Struct. */\nstruct foo {\n\t/** Member. */\n\tint bar;\n};\n')
+
+    captured = _run(monkeypatch, capsys, [str(source), '--timings=json'])
+
+    timings = json.loads(captured.err)
+
+    assert list(timings['phases']) == [
+        'scan',
+        'parse',
+        'diagnostics',
+        'comments',
+        'cursors',
+        'render',
+    ]
+    assert timings['counters'] == {'diagnostics': 0, 'tokens': 10, 'cursors': 1, 'docstrings': 2}
+
+    captured = _run(monkeypatch, capsys, [str(source), '--timings'])
+
+    assert captured.err.startswith('phase')
+
+
+def test_cli_transform_cache(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(__main__, '_transform_cache', TransformCache())
+
+    source = tmp_path / 'source.c'
+    source.write_text(
+        ''.join(f'/** Same as always, @p x. */\nint variable_{i};\n' for i in range(3))
+    )
+
+    captured = _run(
+        monkeypatch, capsys, [str(source), '--process-docstring=javadoc', '--timings=json']
+    )
+
+    assert captured.out.count('Same as always, ``x``.') == 3
+
+    counters = json.loads(captured.err)['counters']
+    assert counters['transform_cache.hits'] == 2
+    assert counters['transform_cache.misses'] == 1
@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import io
+import json
 import os
 import re
 import shutil
@@ -13,6 +14,7 @@ from sphinx.application import Sphinx
 from sphinx.util import console
 from sphinx.util.docutils import docutils_namespace, patch_docutils
 
+import hawkmoth
 from test import testenv
 
 
@@ -115,3 +117,188 @@ def test_extension_text(testcase):
 )
 def test_extension_html(testcase):
     testcase.run_test()
+
+
+@pytest.mark.parametrize('parallel', [0, 2])
+def test_timings_report(tmp_path, parallel):
+    (tmp_path / 'source.c').write_text('/** Function. */\nint function(void);\n')
+
+    outdir = testenv.sphinx_build(
+        tmp_path,
+        "extensions = ['hawkmoth']\nhawkmoth_timings_report = 'timings.json'\n",
+        {
+            'index': '.. toctree::\n\n   a\n   b\n',
+            'a': 'A\n=\n\n.. c:autodoc:: source.c\n',
+            'b': 'B\n=\n\n.. c:autofunction:: function\n   :file: source.c\n',
+        },
+        parallel=parallel,
+    )
+
+    with open(outdir / 'timings.json') as f:
+        report = json.load(f)
+
+    assert sorted(doc['docname'] for doc in report['documents']) == ['a', 'b']
+
+    directives = [d for doc in report['documents'] for d in doc['directives']]
+    assert sorted(d['directive'] for d in directives) == ['c:autodoc', 'c:autofunction']
+
+    for directive in directives:
+        assert set(directive['phases']) >= {'parse', 'filter', 'render', 'nested_parse'}
+        assert directive['counters']['docstrings'] == 1
+
+    # The file is parsed once per process, and found in the memory cache otherwise.
+    [f] = report['files']
+    assert f['file'] == str(tmp_path / 'source.c')
+    assert f['parses'] >= 1
+    assert 'parse' in f['phases']
+
+
+_BATCH_LISTENERS = """
+def process_docstrings(app, batch, transform, options):
+    for lines in batch:
+        lines[:] = [f'{line} batch {len(batch)}' for line in lines]
+
+def process_docstring(app, lines, transform, options):
+    lines[:] = [f'{line} after' for line in lines]
+
+def setup(app):
+    app.connect('hawkmoth-process-docstrings', process_docstrings)
+    app.connect('hawkmoth-process-docstring', process_docstring)
+"""
+
+
+def test_process_docstrings(tmp_path):
+    (tmp_path / 'source.c').write_text(
+        '/** Struct. */\nstruct foo {\n\t/** Member. */\n\tint bar;\n};\n'
+        '/** Function. */\nint baz(void);\n'
+    )
+
+    outdir = testenv.sphinx_build(
+        tmp_path,
+        "extensions = ['hawkmoth']\n" + _BATCH_LISTENERS,
+        {
+            'index': 'Index\n=====\n\n.. c:autodoc:: source.c\n\n'
+            '.. c:autostruct:: foo\n   :file: source.c\n   :members:\n'
+        },
+    )
+
+    output = (outdir / 'index.txt').read_text()
+
+    # All the docstrings of a directive in one batch, before the original event.
+    assert output.count('batch 3 after') == 3
+    assert output.count('batch 2 after') == 2
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_transform_jobs(tmp_path, monkeypatch, jobs):
+    # Transform in chunks of one comment.
+    monkeypatch.setattr(hawkmoth, '_TRANSFORM_CHUNK_SIZE', 1)
+
+    (tmp_path / 'source.c').write_text(
+        ''.join(
+            f'/**\n * Function {i}.\n *\n * Args:\n *     x: Parameter.\n */\nint f{i}(int x);\n'
+            for i in range(5)
+        )
+    )
+
+    outdir = testenv.sphinx_build(
+        tmp_path,
+        "extensions = ['hawkmoth', 'hawkmoth.ext.napoleon']\n"
+        "hawkmoth_transform_default = 'napoleon'\n"
+        f'hawkmoth_transform_cache_size = 0\nhawkmoth_transform_jobs = {jobs}\n',
+        {'index': 'Index\n=====\n\n.. c:autodoc:: source.c\n'},
+    )
+
+    output = (outdir / 'index.txt').read_text()
+
+    # In the original order
+    functions = [f'int f{i}(int x)' for i in range(5)]
+    assert [line.strip() for line in output.splitlines() if line.startswith('int f')] == functions
+    assert output.count('**x** -- Parameter.') == 5
+
+
+_IMPURE_LISTENER = """
+def setup(app):
+    app.connect('hawkmoth-process-docstring', lambda app, lines, transform, options: None)
+"""
+
+
+@pytest.mark.parametrize('impure', [False, True])
+def test_transform_cache(tmp_path, impure):
+    (tmp_path / 'source.c').write_text(
+        ''.join(f'/** Same as always, @p x. */\nint variable_{i};\n' for i in range(3))
+    )
+
+    outdir = testenv.sphinx_build(
+        tmp_path,
+        "extensions = ['hawkmoth', 'hawkmoth.ext.javadoc']\n"
+        "hawkmoth_transform_default = 'javadoc'\n"
+        "hawkmoth_timings_report = 'timings.json'\n" + (_IMPURE_LISTENER if impure else ''),
+        {'index': 'Index\n=====\n\n.. c:autodoc:: source.c\n'},
+    )
+
+    assert (outdir / 'index.txt').read_text().count('Same as always, "x".') == 3
+
+    with open(outdir / 'timings.json') as f:
+        report = json.load(f)
+
+    [directive] = report['documents'][0]['directives']
+    counters = directive['counters']
+
+    if impure:
+        assert 'transform_cache.hits' not in counters
+        assert 'transform_cache.misses' not in counters
+    else:
+        assert counters['transform_cache.hits'] == 2
+        assert counters['transform_cache.misses'] == 1
+
+
+def test_parse_jobs_parallel_build(tmp_path):
+    for i in range(2):
+        (tmp_path / f'source{i}.c').write_text(f'/** Function {i}. */\nint function{i}(void);\n')
+
+    # Enough documents for Sphinx to read them in parallel.
+    docnames = [f'doc{i}' for i in range(8)]
+    documents = {docname: f'{docname}\n====\n\n.. c:autodoc:: source*.c\n' for docname in docnames}
+    documents['index'] = '.. toctree::\n\n' + ''.join(f'   {d}\n' for d in docnames)
+
+    outdir = testenv.sphinx_build(
+        tmp_path,
+        "extensions = ['hawkmoth']\nhawkmoth_parse_jobs = 2\n",
+        documents,
+        parallel=2,
+    )
+
+    for docname in docnames:
+        output = (outdir / f'{docname}.txt').read_text()
+        assert 'Function 0.' in output
+        assert 'Function 1.' in output
+
+
+def test_transform_jobs_parallel_build(tmp_path, monkeypatch):
+    # Transform in chunks of one comment.
+    monkeypatch.setattr(hawkmoth, '_TRANSFORM_CHUNK_SIZE', 1)
+
+    (tmp_path / 'source.c').write_text(
+        ''.join(
+            f'/**\n * Function {i}.\n *\n * Args:\n *     x: Parameter.\n */\nint f{i}(int x);\n'
+            for i in range(5)
+        )
+    )
+
+    # Enough documents for Sphinx to read them in parallel.
+    docnames = [f'doc{i}' for i in range(8)]
+    documents = {docname: f'{docname}\n====\n\n.. c:autodoc:: source.c\n' for docname in docnames}
+    documents['index'] = '.. toctree::\n\n' + ''.join(f'   {d}\n' for d in docnames)
+
+    outdir = testenv.sphinx_build(
+        tmp_path,
+        "extensions = ['hawkmoth', 'hawkmoth.ext.napoleon']\n"
+        "hawkmoth_transform_default = 'napoleon'\n"
+        'hawkmoth_transform_cache_size = 0\nhawkmoth_transform_jobs = 2\n',
+        documents,
+        parallel=2,
+    )
+
+    for docname in docnames:
+        assert (outdir / f'{docname}.txt').read_text().count('**x** -- Parameter.') == 5
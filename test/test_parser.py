@@ -5,9 +5,9 @@
 
 import pytest
 
-from hawkmoth import docstring
+from hawkmoth import docstring, parser
 from hawkmoth.ext import javadoc, napoleon
-from hawkmoth.parser import parse
+from hawkmoth.parser import ParseSession, parse
 from test import testenv
 
 
@@ -164,3 +164,184 @@ def _get_parser_testcases(path):
 @pytest.mark.parametrize('testcase', _get_parser_testcases(testenv.testdir), ids=testenv.get_testid)
 def test_parser(testcase):
     testcase.run_test()
+
+
+def test_parse_session(tmp_path):
+    header = tmp_path / 'header.h'
+    header.write_text('#define ARGS int foo\n')
+
+    source = tmp_path / 'source.c'
+    source.write_text('#include "header.h"\n\n/** Function. */\nint function(ARGS);\n')
+
+    def get_output(root):
+        processor = Processor(None)
+        return [ds.get_docstring(processor=processor)[0] for ds in root.walk()]
+
+    session = ParseSession()
+
+    root, errors = session.parse(str(source), domain='c')
+    assert not errors
+    assert get_output(root) == get_output(parse(str(source), domain='c')[0])
+
+    # Previous results must survive reparsing.
+    old_root, _ = session.parse(str(source), domain='c')
+
+    # Changes in included files are noticed.
+    header.write_text('#define ARGS int foo, int bar\n')
+
+    root, errors = session.parse(str(source), domain='c')
+    assert not errors
+    assert '.. c:function:: int function(int foo, int bar)' in get_output(root)[0]
+    assert '.. c:function:: int function(int foo)' in get_output(old_root)[0]
+
+    # Changes in the file itself are noticed.
+    source.write_text('#include "header.h"\n\n/** Function. */\nvoid function(ARGS);\n')
+
+    root, errors = session.parse(str(source), domain='c')
+    assert not errors
+    assert '.. c:function:: void function(int foo, int bar)' in get_output(root)[0]
+
+
+def test_parse_without_doc_comments(tmp_path, monkeypatch):
+    source = tmp_path / 'source.c'
+    source.write_text(
+        '/* Not a documentation comment. */\n'
+        '// Not a /** documentation comment */ either.\n'
+        'const char *s = "/** Not a documentation comment. */";\n'
+        "char c = '\"'; /**/\n"
+    )
+
+    def index_create():
+        raise AssertionError('libclang used for file without documentation comments')
+
+    monkeypatch.setattr(parser.Index, 'create', index_create)
+
+    root, errors = parse(str(source), domain='c')
+
+    assert not errors
+    assert list(root) == []
+
+
+def test_parse_main_file_only(tmp_path, monkeypatch):
+    header = tmp_path / 'header.hpp'
+    header.write_text('#define ANSWER 42\nnamespace ns {\nint foo;\n}\n')
+
+    source = tmp_path / 'source.cpp'
+    source.write_text('#include "header.hpp"\n\n/** Variable. */\nint bar = ANSWER;\n')
+
+    wrapped = []
+
+    class DocCursor(parser.DocCursor):
+        def __init__(self, cursor=None, **kwargs):
+            wrapped.append(cursor.location.file.name)
+            super().__init__(cursor=cursor, **kwargs)
+
+    monkeypatch.setattr(parser, 'DocCursor', DocCursor)
+
+    root, errors = parse(str(source), domain='cpp')
+
+    assert not errors
+    assert [ds.get_name() for ds in root.walk()] == ['bar']
+    assert set(wrapped) == {str(source)}
+
+
+def test_parse_lazy(tmp_path):
+    source = tmp_path / 'source.c'
+    source.write_text('/** Function. */\nint function(int foo);\n')
+
+    root, errors = parse(str(source), domain='c')
+    assert not errors
+
+    [ds] = root.walk()
+    assert not hasattr(ds, '__dict__')
+    assert not hasattr(ds, '_args_value')
+
+    lines, _ = ds.get_docstring(processor=Processor(None))
+    assert hasattr(ds, '_args_value')
+
+    root.materialize()
+    assert ds.get_docstring(processor=Processor(None))[0] == lines
+
+
+def test_find(tmp_path):
+    source = tmp_path / 'source.c'
+    source.write_text(
+        '/** Struct. */\n'
+        'struct foo {\n'
+        '\t/** Member a. */\n'
+        '\tint a;\n'
+        '\t/** Member b. */\n'
+        '\tint b;\n'
+        '};\n'
+        '/** Function. */\n'
+        'int bar(void);\n'
+        '/** Variable. */\n'
+        'int baz;\n'
+    )
+
+    root, errors = parse(str(source), domain='c')
+    assert not errors
+
+    def names(docstrings):
+        return [ds.get_name() for ds in docstrings]
+
+    assert names(root.find(['baz', 'foo', 'baz'])) == ['foo', 'baz']
+    assert names(root.find(['bar', 'baz'], types=[docstring.VarDocstring])) == ['baz']
+    assert names(root.find(['nonexistent'])) == []
+
+    [struct] = root.find(['foo'])
+    assert names(struct.find(['b', 'a'])) == ['a', 'b']
+
+
+def test_children_order():
+    def text(line):
+        return docstring.TextDocstring(text=f'Line {line}.', meta={'line': line})
+
+    def lines(docstrings):
+        return [ds.get_line() for ds in docstrings]
+
+    root = docstring.RootDocstring(filename='source.c', domain='c', clang_args=None)
+    struct = docstring.StructDocstring(cursor=None, nest=0)
+    struct._line = 5
+
+    root.add_children([text(1), text(9), struct, text(3)])
+    struct.add_child(text(7))
+
+    assert lines(root) == [1, 3, 5, 9]
+    assert lines(root.walk()) == [1, 3, 7, 9]
+
+    # Changes in the children are reflected in the walk of the ancestors.
+    struct.add_children([text(6), text(8)])
+
+    assert lines(root.walk()) == [1, 3, 6, 7, 8, 9]
+
+
+def test_get_docstrings(tmp_path):
+    source = tmp_path / 'source.c'
+    source.write_text(
+        '/**\n * Struct with @p x.\n */\n'
+        'struct foo {\n'
+        '\t/** Member @p a. */\n'
+        '\tint a;\n'
+        '};\n'
+        '/** Function @p y. */\n'
+        'int bar(int y);\n'
+    )
+
+    root, errors = parse(str(source), domain='c')
+    assert not errors
+
+    batches = []
+
+    class BatchProcessor(Processor):
+        def process_docstrings(self, batch):
+            batches.append(len(batch))
+            javadoc.process_docstrings(batch)
+
+    docstrings = list(root.walk())
+    processor = Processor('javadoc')
+
+    assert docstring.get_docstrings(docstrings, BatchProcessor(None)) == [
+        ds.get_docstring(processor=processor) for ds in docstrings
+    ]
+    assert batches == [3]
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Jani Nikula <jani@nikula.org>
+# SPDX-License-Identifier: BSD-2-Clause
+
+import io
+import sys
+
+import pytest
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+
+from hawkmoth import docstring, parser, symboldb
+from hawkmoth.__main__ import main
+
+
+def _get_output(root):
+    processor = docstring.DocstringProcessor()
+
+    return [ds.get_docstring(processor=processor) for ds in root.walk()]
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / 'source.c'
+    source.write_text(
+        '/** Struct. */\n'
+        'struct foo {\n'
+        '\t/** Member. */\n'
+        '\tint a;\n'
+        '};\n'
+        '/** Function. */\n'
+        'int bar(int baz);\n'
+        '/** Unknown type. */\n'
+        'unknown_type qux;\n'
+    )
+
+    return str(source)
+
+
+def _no_libclang(monkeypatch):
+    def index_create():
+        raise AssertionError('libclang used with symbol database')
+
+    monkeypatch.setattr(parser.Index, 'create', index_create)
+
+
+def test_symbol_database(tmp_path, source, monkeypatch):
+    path = str(tmp_path / 'symbols.db')
+
+    root, errors = parser.parse(source, domain='c')
+    assert errors
+
+    symboldb.write(path, [(root, errors)], root=str(tmp_path))
+
+    _no_libclang(monkeypatch)
+
+    database = symboldb.SymbolDatabase(path)
+
+    db_root, db_errors = database.get(source, 'c', root=str(tmp_path))
+
+    assert _get_output(db_root) == _get_output(root)
+    assert db_errors == errors
+    assert db_root.get_filename() == source
+    assert db_root.get_clang_args() == root.get_clang_args()
+
+    assert database.get(source, 'cpp', root=str(tmp_path)) is None
+    assert database.get(source, 'c', root=str(tmp_path / 'nonexistent')) is None
+
+
+def test_symbol_database_lazy(tmp_path, source):
+    path = str(tmp_path / 'symbols.db')
+
+    symboldb.write(path, [parser.parse(source, domain='c')], root=str(tmp_path))
+
+    db_root, _ = symboldb.SymbolDatabase(path).get(
+        source, 'c', root=str(tmp_path), clang_args=['-DFOO']
+    )
+
+    assert db_root.get_clang_args() == ['-DFOO']
+
+    [function] = db_root.find(['bar'], types=[docstring.FunctionDocstring])
+    assert function.get_name() == 'bar'
+    assert list(db_root.find(['bar'], types=[docstring.VarDocstring])) == []
+
+    # Only the found docstring has been decoded.
+    assert sum(child is not None for child in db_root._children) == 1
+
+
+def test_symbol_database_invalid(tmp_path):
+    path = tmp_path / 'symbols.db'
+    path.write_bytes(b'/** Not a database. */\n')
+
+    with pytest.raises(ValueError):
+        symboldb.SymbolDatabase(str(path))
+
+
+def test_extract(tmp_path, source, monkeypatch, capsys):
+    path = str(tmp_path / 'symbols.db')
+
+    monkeypatch.setattr(
+        sys, 'argv', ['hawkmoth', 'extract', '--root', str(tmp_path), '-o', path, source]
+    )
+    main()
+
+    assert 'unknown_type' in capsys.readouterr().err
+
+    db_root, _ = symboldb.SymbolDatabase(path).get(source, 'c', root=str(tmp_path))
+
+    assert [ds.get_name() for ds in db_root.walk()] == ['foo', 'a', 'bar', 'qux']
+
+
+def test_extension(tmp_path, source, monkeypatch):
+    symboldb.write(
+        str(tmp_path / 'symbols.db'), [parser.parse(source, domain='c')], root=str(tmp_path)
+    )
+
+    (tmp_path / 'conf.py').write_text(
+        "extensions = ['hawkmoth']\nhawkmoth_symbol_database = 'symbols.db'\n"
+    )
+    (tmp_path / 'index.rst').write_text('.. c:autofunction:: bar\n   :file: source.c\n')
+
+    _no_libclang(monkeypatch)
+
+    warning = io.StringIO()
+
+    with docutils_namespace():
+        app = Sphinx(
+            srcdir=str(tmp_path),
+            confdir=str(tmp_path),
+            outdir=str(tmp_path / 'text'),
+            doctreedir=str(tmp_path / 'doctrees'),
+            buildername='text',
+            status=None,
+            warning=warning,
+        )
+        app.build()
+
+    output = (tmp_path / 'text' / 'index.txt').read_text()
+
+    assert 'int bar(int baz)' in output
+    assert 'Function.' in output
+    assert 'unknown_type' in warning.getvalue()
@@ -2,11 +2,14 @@
 # SPDX-FileCopyrightText: 2025 Bruno Santos <brunomanuelsantos@tecnico.ulisboa.pt>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import io
 import os
 import sys
 
 import pytest
 import strictyaml
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
 
 from hawkmoth.util import compiler
 from test import conf
@@ -162,3 +165,29 @@ def read_file(filename, optional=False):
 
     with open(filename) as f:
         return f.read()
+
+
+def sphinx_build(srcdir, conf, documents, parallel=0):
+    """Build a Sphinx project in srcdir using the text builder.
+
+    Write conf.py and the documents, a dict of document names and their
+    reStructuredText, to srcdir. Return the output directory.
+    """
+    (srcdir / 'conf.py').write_text(conf)
+    for docname, rst in documents.items():
+        (srcdir / f'{docname}.rst').write_text(rst)
+
+    with docutils_namespace():
+        app = Sphinx(
+            srcdir=str(srcdir),
+            confdir=str(srcdir),
+            outdir=str(srcdir / 'text'),
+            doctreedir=str(srcdir / 'doctrees'),
+            buildername='text',
+            status=None,
+            warning=io.StringIO(),
+            parallel=parallel,
+        )
+        app.build()
+
+    return srcdir / 'text'